@@ -4,194 +4,265 @@ Integrates with existing Node.js backend and adds new AI-powered features
 """
 
 from flask import Flask, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-import json
-import asyncio
+from flask_caching import Cache
+from pydantic import BaseModel, ConfigDict, ValidationError
+import orjson
 from datetime import datetime
+from functools import lru_cache
+from typing import List, Optional
 import os
 import sys
 
-# Add the pythonScript directory to the path
-sys.path.append(os.path.join(os.path.dirname(__file__), 'pythonScript'))
+# Add the pythonScript directory to the path (first, so project modules resolve without scanning the rest)
+PYTHON_SCRIPT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pythonScript')
+if PYTHON_SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, PYTHON_SCRIPT_DIR)
 
 from safe_route_ai_system import SafeRouteAISystem
-from sakha_chatbot import ChatbotState
+
+class ORJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(
+            obj,
+            default=self.default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        ).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 CORS(app)
+cache = Cache(app, config={'CACHE_TYPE': 'SimpleCache'})
+
+# Safety score predictions are cached per 5-minute time bucket
+SCORE_BUCKET_MINUTES = 5
+
+@lru_cache(maxsize=1)
+def get_system():
+    """Return the process-wide AI system, building it on first use.
+    Under Gunicorn the master builds it before forking (see gunicorn.conf.py),
+    so workers share the loaded model through copy-on-write pages.
+    SAFE_ROUTE_MODEL_PATH picks the model file; SAFE_ROUTE_ALLOW_TRAINING=0
+    refuses to train one when it is missing."""
+    return SafeRouteAISystem(
+        model_path=os.environ.get('SAFE_ROUTE_MODEL_PATH'),
+        allow_training=os.environ.get('SAFE_ROUTE_ALLOW_TRAINING', '1') != '0'
+    )
+
+# Request schemas
+class LatLng(BaseModel):
+    lat: float
+    lng: float
+
+class PlanRouteRequest(BaseModel):
+    source: LatLng
+    destination: LatLng
+    user_id: str
+    departure_time: Optional[datetime] = None
+    verbose: bool = True  # False returns columnar "waypoint_arrays"
+
+class UpdateLocationRequest(BaseModel):
+    user_id: str
+    location: LatLng
+    speed: float = 0.0
+    accuracy: float = 10.0
+
+class SakhaChatRequest(BaseModel):
+    user_id: str
+    message: str
+
+class EmergencyContact(BaseModel):
+    model_config = ConfigDict(extra='allow')
+    
+    name: str
+    phone: str
 
-# Initialize the AI system
-safe_route_ai = SafeRouteAISystem()
+class EmergencyContactsRequest(BaseModel):
+    user_id: str
+    contacts: List[EmergencyContact]
+
+class PredictSafetyScoreRequest(BaseModel):
+    lat: float
+    lng: float
+    timestamp: Optional[datetime] = None
+
+def request_payload():
+    """JSON request body, or {} when it is missing or not JSON"""
+    return request.get_json(silent=True) or {}
+
+def parse_request(schema):
+    """Validate the JSON request body against a request schema"""
+    return schema.model_validate(request_payload())
+
+def validation_error_body(error: ValidationError):
+    """Error body describing the first validation error"""
+    first_error = error.errors()[0]
+    field = '.'.join(str(part) for part in first_error['loc'])
+    
+    if first_error['type'] == 'missing':
+        message = f"Missing required field: {field}"
+    else:
+        message = f"Invalid field {field}: {first_error['msg']}"
+    
+    return {"error": message}
+
+def validation_error_response(error: ValidationError):
+    """Build a 400 response from the first validation error"""
+    return jsonify(validation_error_body(error)), 400
 
 @app.route('/health', methods=['GET'])
+@cache.cached(timeout=5)
 def health_check():
     """Health check endpoint"""
     return jsonify({
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "system_status": safe_route_ai.get_system_status()
+        "system_status": get_system().get_system_status()
     })
 
-@app.route('/api/plan-safe-route', methods=['POST'])
-def plan_safe_route():
-    """Plan an AI-optimized safe route"""
+def _plan_safe_route(payload):
+    """Plan an AI-optimized safe route; returns (body, status)"""
     try:
-        data = request.get_json()
-        
-        # Validate required fields
-        required_fields = ['source', 'destination', 'user_id']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({"error": f"Missing required field: {field}"}), 400
-        
-        source = data['source']
-        destination = data['destination']
-        user_id = data['user_id']
-        
-        # Optional fields
-        departure_time = data.get('departure_time')
-        if departure_time:
-            departure_time = datetime.fromisoformat(departure_time)
+        data = PlanRouteRequest.model_validate(payload)
         
         # Plan the route
-        route_response = safe_route_ai.plan_safe_route(
-            start_lat=source['lat'],
-            start_lng=source['lng'],
-            end_lat=destination['lat'],
-            end_lng=destination['lng'],
-            user_id=user_id,
-            departure_time=departure_time
+        route_response = get_system().plan_safe_route(
+            start_lat=data.source.lat,
+            start_lng=data.source.lng,
+            end_lat=data.destination.lat,
+            end_lng=data.destination.lng,
+            user_id=data.user_id,
+            departure_time=data.departure_time,
+            verbose=data.verbose
         )
         
         if 'error' in route_response:
-            return jsonify(route_response), 500
+            return route_response, 500
         
-        return jsonify({
+        return {
             "success": True,
             "data": route_response
-        })
+        }, 200
         
+    except ValidationError as e:
+        return validation_error_body(e), 400
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
 
-@app.route('/api/update-location', methods=['POST'])
-def update_location():
-    """Update user location and get safety status"""
+def _update_location(payload):
+    """Update user location and get safety status; returns (body, status)"""
     try:
-        data = request.get_json()
-        
-        # Validate required fields
-        required_fields = ['user_id', 'location']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({"error": f"Missing required field: {field}"}), 400
-        
-        user_id = data['user_id']
-        location = data['location']
-        speed = data.get('speed', 0.0)
-        accuracy = data.get('accuracy', 10.0)
+        data = UpdateLocationRequest.model_validate(payload)
         
         # Update location
-        location_response = safe_route_ai.update_user_location(
-            user_id=user_id,
-            lat=location['lat'],
-            lng=location['lng'],
-            speed=speed,
-            accuracy=accuracy
+        location_response = get_system().update_user_location(
+            user_id=data.user_id,
+            lat=data.location.lat,
+            lng=data.location.lng,
+            speed=data.speed,
+            accuracy=data.accuracy
         )
         
-        return jsonify({
+        return {
             "success": True,
             "data": location_response
-        })
+        }, 200
         
+    except ValidationError as e:
+        return validation_error_body(e), 400
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
 
-@app.route('/api/sakha-chat', methods=['POST'])
-def sakha_chat():
-    """Chat with Sakha safety assistant"""
+def _sakha_chat(payload):
+    """Chat with Sakha safety assistant; returns (body, status)"""
     try:
-        data = request.get_json()
-        
-        # Validate required fields
-        if 'user_id' not in data or 'message' not in data:
-            return jsonify({"error": "Missing required fields: user_id, message"}), 400
-        
-        user_id = data['user_id']
-        message = data['message']
+        data = SakhaChatRequest.model_validate(payload)
+        user_id = data.user_id
         
+        safe_route_ai = get_system()
+
         # Create user session if it doesn't exist
-        if user_id not in safe_route_ai.user_sessions:
-            safe_route_ai.user_sessions[user_id] = {
-                "route_id": None,
-                "current_location": None,
-                "safety_status": "monitoring",
-                "last_update": datetime.now(),
-                "last_sakha_interaction": None
-            }
+        safe_route_ai.ensure_user_session(user_id)
         
         # Activate Sakha if not already active
-        if safe_route_ai.sakha_chatbot.state.value == "idle":
-            safe_route_ai.sakha_chatbot.state = ChatbotState.ACTIVE
+        safe_route_ai.activate_sakha()
         
         # Process message through Sakha
-        sakha_response = safe_route_ai.process_sakha_message(user_id, message)
+        sakha_response = safe_route_ai.process_sakha_message(user_id, data.message)
         
-        return jsonify({
+        return {
             "success": True,
             "data": sakha_response
-        })
+        }, 200
         
+    except ValidationError as e:
+        return validation_error_body(e), 400
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
 
-@app.route('/api/safety-status/<user_id>', methods=['GET'])
-def get_safety_status(user_id):
-    """Get comprehensive safety status for a user"""
+def _safety_status(payload):
+    """Get comprehensive safety status for payload["user_id"]; returns (body, status)"""
     try:
-        safety_status = safe_route_ai.get_user_safety_status(user_id)
+        safety_status = get_system().get_user_safety_status(str(payload.get('user_id', '')))
         
         if 'error' in safety_status:
-            return jsonify(safety_status), 404
+            return safety_status, 404
         
-        return jsonify({
+        return {
             "success": True,
             "data": safety_status
-        })
+        }, 200
         
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
+
+@app.route('/api/plan-safe-route', methods=['POST'])
+def plan_safe_route():
+    """Plan an AI-optimized safe route"""
+    body, status = _plan_safe_route(request_payload())
+    return jsonify(body), status
+
+@app.route('/api/update-location', methods=['POST'])
+def update_location():
+    """Update user location and get safety status"""
+    body, status = _update_location(request_payload())
+    return jsonify(body), status
+
+@app.route('/api/sakha-chat', methods=['POST'])
+def sakha_chat():
+    """Chat with Sakha safety assistant"""
+    body, status = _sakha_chat(request_payload())
+    return jsonify(body), status
+
+@app.route('/api/safety-status/<user_id>', methods=['GET'])
+def get_safety_status(user_id):
+    """Get comprehensive safety status for a user"""
+    body, status = _safety_status({"user_id": user_id})
+    return jsonify(body), status
 
 @app.route('/api/emergency-contacts', methods=['POST'])
 def set_emergency_contacts():
     """Set emergency contacts for a user"""
     try:
-        data = request.get_json()
-        
-        # Validate required fields
-        if 'user_id' not in data or 'contacts' not in data:
-            return jsonify({"error": "Missing required fields: user_id, contacts"}), 400
-        
-        user_id = data['user_id']
-        contacts = data['contacts']
-        
-        # Validate contacts format
-        if not isinstance(contacts, list):
-            return jsonify({"error": "Contacts must be a list"}), 400
-        
-        for contact in contacts:
-            if not isinstance(contact, dict) or 'name' not in contact or 'phone' not in contact:
-                return jsonify({"error": "Each contact must have 'name' and 'phone' fields"}), 400
+        data = parse_request(EmergencyContactsRequest)
+        contacts = [contact.model_dump() for contact in data.contacts]
         
         # Set emergency contacts
-        contacts_response = safe_route_ai.set_emergency_contacts(user_id, contacts)
+        contacts_response = get_system().set_emergency_contacts(data.user_id, contacts)
         
         return jsonify({
             "success": True,
             "data": contacts_response
         })
         
+    except ValidationError as e:
+        return validation_error_response(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -199,7 +270,7 @@ def set_emergency_contacts():
 def end_session(user_id):
     """End user session"""
     try:
-        end_response = safe_route_ai.end_user_session(user_id)
+        end_response = get_system().end_user_session(user_id)
         
         if 'error' in end_response:
             return jsonify(end_response), 404
@@ -212,25 +283,30 @@ def end_session(user_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@cache.memoize(timeout=60)
+def _predict_bucketed_safety_score(lat, lng, bucket_start):
+    """Predict safety score for a location and time bucket (memoized)"""
+    return float(get_system().safety_model.predict_safety_score(lat, lng, bucket_start))
+
 @app.route('/api/predict-safety-score', methods=['POST'])
 def predict_safety_score():
     """Predict safety score for a specific location and time"""
     try:
-        data = request.get_json()
-        
-        # Validate required fields
-        if 'lat' not in data or 'lng' not in data:
-            return jsonify({"error": "Missing required fields: lat, lng"}), 400
-        
-        lat = data['lat']
-        lng = data['lng']
-        timestamp = data.get('timestamp')
-        
-        if timestamp:
-            timestamp = datetime.fromisoformat(timestamp)
+        data = parse_request(PredictSafetyScoreRequest)
+        lat = data.lat
+        lng = data.lng
+        timestamp = data.timestamp or datetime.now()
+        
+        # Bucket on the client's wall-clock time, dropping any UTC offset, so
+        # the predicted hour does not depend on the server's timezone
+        local_time = timestamp.replace(tzinfo=None)
+        bucket_start = local_time.replace(
+            minute=local_time.minute - local_time.minute % SCORE_BUCKET_MINUTES,
+            second=0, microsecond=0
+        )
         
         # Predict safety score
-        safety_score = safe_route_ai.safety_model.predict_safety_score(lat, lng, timestamp)
+        safety_score = _predict_bucketed_safety_score(lat, lng, bucket_start)
         
         return jsonify({
             "success": True,
@@ -242,14 +318,17 @@ def predict_safety_score():
             }
         })
         
+    except ValidationError as e:
+        return validation_error_response(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/system-status', methods=['GET'])
+@cache.cached(timeout=5)
 def get_system_status():
     """Get overall system status"""
     try:
-        system_status = safe_route_ai.get_system_status()
+        system_status = get_system().get_system_status()
         
         return jsonify({
             "success": True,
@@ -259,6 +338,47 @@ def get_system_status():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Most calls one /api/batch request may carry; each plan_route runs the
+# optimizer and model, so an unbounded list could hold a worker indefinitely
+MAX_BATCH_CALLS = 10
+
+# Endpoint handlers reachable through /api/batch: op -> handler(payload)
+BATCH_OPS = {
+    'plan_route': _plan_safe_route,
+    'update_location': _update_location,
+    'sakha_chat': _sakha_chat,
+    'safety_status': _safety_status,
+}
+
+@app.route('/api/batch', methods=['POST'])
+def batch():
+    """Run several API calls in one request.
+    The body is a list of {"op": ..., **payload}; each result is
+    {"status": ..., "body": ...}, the status and body the single endpoint
+    would have returned."""
+    calls = request.get_json(silent=True)
+    if not isinstance(calls, list):
+        return jsonify({"error": "Batch body must be a list of calls"}), 400
+    if len(calls) > MAX_BATCH_CALLS:
+        return jsonify({"error": f"Batch may contain at most {MAX_BATCH_CALLS} calls"}), 400
+    
+    results = []
+    for call in calls:
+        if not isinstance(call, dict):
+            results.append({"status": 400, "body": {"error": "Batch call must be an object"}})
+            continue
+        
+        op = call.get('op')
+        if op not in BATCH_OPS:
+            results.append({"status": 400, "body": {"error": f"Unknown batch op: {op}"}})
+            continue
+        
+        payload = {key: value for key, value in call.items() if key != 'op'}
+        body, status = BATCH_OPS[op](payload)
+        results.append({"status": status, "body": body})
+    
+    return jsonify(results)
+
 # Error handlers
 @app.errorhandler(404)
 def not_found(error):
@@ -270,7 +390,7 @@ def internal_error(error):
 
 if __name__ == '__main__':
     print("Starting Enhanced Safe Route AI API Server...")
-    print("System Status:", safe_route_ai.get_system_status())
+    print("System Status:", get_system().get_system_status())
     
-    # Run the Flask app
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Development server only; use `gunicorn -c gunicorn.conf.py` in production
+    app.run(host='0.0.0.0', port=5000)
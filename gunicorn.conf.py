@@ -0,0 +1,26 @@
+"""
+Gunicorn configuration for the Safe Route AI API server
+Usage: gunicorn -c gunicorn.conf.py
+"""
+
+import os
+
+wsgi_app = 'enhanced_api_server:app'
+bind = os.environ.get('SAFE_ROUTE_BIND', '0.0.0.0:5000')
+
+# User sessions, routes and geofences live in process memory, and Gunicorn
+# cannot pin a client to one worker, so a single worker serves every request
+# and threads provide the concurrency. Raise WEB_CONCURRENCY only once that
+# state is shared between processes.
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+worker_class = 'gthread'
+threads = 4
+
+# Import the app (and load the safety model) once in the master, then fork
+preload_app = True
+
+
+def when_ready(server):
+    """Build the AI system in the master so forked workers share its pages"""
+    from enhanced_api_server import get_system
+    get_system()
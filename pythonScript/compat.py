@@ -0,0 +1,8 @@
+"""
+Compat - Python version shims shared by the AI modules
+"""
+
+import sys
+
+# Slotted records drop the per-instance __dict__ (slots= needs Python 3.10+)
+DATACLASS_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
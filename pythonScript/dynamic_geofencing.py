@@ -1,4 +1,5 @@
 import numpy as np
+import math
 import json
 from datetime import datetime, timedelta
 from typing import List, Dict, Tuple
@@ -6,6 +7,9 @@ import time
 import threading
 from dataclasses import dataclass
 from enum import Enum
+from functools import lru_cache
+
+from compat import DATACLASS_SLOTS
 
 class AlertPhase(Enum):
     NORMAL = "normal"
@@ -13,7 +17,7 @@ class AlertPhase(Enum):
     ESCALATION = "escalation"
     EMERGENCY = "emergency"
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class LocationData:
     lat: float
     lng: float
@@ -21,7 +25,7 @@ class LocationData:
     speed: float = 0.0
     accuracy: float = 10.0
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class SafetyZone:
     center_lat: float
     center_lng: float
@@ -32,74 +36,113 @@ class SafetyZone:
 class DynamicGeofencing:
     def __init__(self, safety_model=None):
         self.safety_model = safety_model
-        self.user_location_history = []
+        
+        # Location history as a ring buffer of parallel arrays (oldest slot
+        # is overwritten once full); timestamps are POSIX seconds
+        self.history_size = 100
+        self._hist_lat = np.empty(self.history_size)
+        self._hist_lng = np.empty(self.history_size)
+        self._hist_speed = np.empty(self.history_size)
+        self._hist_accuracy = np.empty(self.history_size)
+        self._hist_ts = np.empty(self.history_size)
+        self._hist_sin_lat = np.empty(self.history_size)  # trig of latitude,
+        self._hist_cos_lat = np.empty(self.history_size)  # taken at insert time
+        self._hist_head = 0  # next slot to write
+        self._hist_count = 0
+        
         self.planned_route = []
+        self._route_lat = np.empty(0)
+        self._route_lng = np.empty(0)
+        self._sin_route_lat = np.empty(0)
+        self._cos_route_lat = np.empty(0)
         self.safety_zones = []
+        self._zone_scores = np.empty(0)
+        self._zone_radius = np.empty(0)
         self.current_phase = AlertPhase.NORMAL
+        # Escalation path per phase: (next phase, alert trigger, response
+        # check that holds the phase when it returns True); EMERGENCY is final
+        self._transitions = {
+            AlertPhase.NORMAL: (AlertPhase.SOFT_CHECK, self._trigger_soft_check_alert, None),
+            AlertPhase.SOFT_CHECK: (AlertPhase.ESCALATION, self._trigger_escalation_alert,
+                                   self._user_responded_to_soft_check),
+            AlertPhase.ESCALATION: (AlertPhase.EMERGENCY, self._trigger_emergency_alert,
+                                    self._user_responded_to_escalation),
+        }
         self.anomaly_threshold = 5.0  # minutes
         self.speed_threshold = 1.0  # km/h (stopped)
         self.safety_score_threshold = 30  # Below this is considered unsafe
         
+        # Off-route model scores cached on a ~11m grid per clock hour
+        self.score_grid_scale = 10000  # grid cells per degree
+        self._grid_score = lru_cache(maxsize=65536)(self._predict_grid_score)
+        
     def set_planned_route(self, route_coordinates: List[Tuple[float, float]]):
-        """Set the planned safe route"""
+        """Set the planned safe route (list of (lat, lng) pairs or an (N, 2) array)"""
         self.planned_route = route_coordinates
+        
+        # Keep the route in radians so deviation checks are one vectorized pass
+        route = np.asarray(route_coordinates, dtype=np.float64).reshape(-1, 2)
+        self._route_lat = np.radians(route[:, 0])
+        self._route_lng = np.radians(route[:, 1])
+        self._sin_route_lat = np.sin(self._route_lat)
+        self._cos_route_lat = np.cos(self._route_lat)
+        
         self.safety_zones = self._create_safety_zones(route_coordinates)
+        
+        # Zone scores aligned with the route arrays, reused by alert checks
+        self._zone_scores = np.array([zone.safety_score for zone in self.safety_zones])
+        self._zone_radius = np.array([zone.radius for zone in self.safety_zones])
     
     def _create_safety_zones(self, route_coordinates: List[Tuple[float, float]]):
         """Create safety zones along the planned route"""
-        zones = []
-        
-        for i, (lat, lng) in enumerate(route_coordinates):
-            if self.safety_model:
-                safety_score = self.safety_model.predict_safety_score(lat, lng)
-            else:
-                safety_score = 50  # Default score
-            
-            zone_type = self._classify_zone_type(safety_score)
-            radius = self._calculate_zone_radius(safety_score)
-            
-            zone = SafetyZone(
-                center_lat=lat,
-                center_lng=lng,
-                radius=radius,
-                safety_score=safety_score,
-                zone_type=zone_type
-            )
-            zones.append(zone)
+        route = np.asarray(route_coordinates, dtype=np.float64).reshape(-1, 2)
         
-        return zones
-    
-    def _classify_zone_type(self, safety_score: float) -> str:
-        """Classify zone type based on safety score"""
-        if safety_score >= 70:
-            return 'safe'
-        elif safety_score >= 40:
-            return 'moderate'
+        # Score every waypoint in one model call
+        if self.safety_model and len(route):
+            safety_scores = self.safety_model.predict_safety_score_batch(route[:, 0], route[:, 1])
         else:
-            return 'high_risk'
+            safety_scores = np.full(len(route), 50.0)  # Default score
+        
+        zone_types = self._classify_zone_type(safety_scores)
+        radii = self._calculate_zone_radius(safety_scores)
+        
+        return [
+            SafetyZone(
+                center_lat=float(lat),
+                center_lng=float(lng),
+                radius=float(radius),
+                safety_score=float(safety_score),
+                zone_type=str(zone_type)
+            )
+            for (lat, lng), radius, safety_score, zone_type
+            in zip(route, radii, safety_scores, zone_types)
+        ]
     
-    def _calculate_zone_radius(self, safety_score: float) -> float:
-        """Calculate zone radius based on safety score"""
+    def _classify_zone_type(self, safety_score):
+        """Classify zone type based on safety score (scalar or array)"""
+        return np.where(safety_score >= 70, 'safe',
+                        np.where(safety_score >= 40, 'moderate', 'high_risk'))
+    
+    def _calculate_zone_radius(self, safety_score):
+        """Calculate zone radius based on safety score (scalar or array)"""
         # Higher safety score = larger safe zone
         base_radius = 50  # meters
         safety_multiplier = safety_score / 100
         return base_radius + (safety_multiplier * 100)
     
-    def update_user_location(self, lat: float, lng: float, speed: float = 0.0, accuracy: float = 10.0):
-        """Update user location and check for anomalies"""
+    def update_user_location(self, lat: float, lng: float, speed: float = 0.0, accuracy: float = 10.0,
+                             timestamp: datetime = None):
+        """Update user location and check for anomalies (timestamp defaults to now)"""
+        # One clock read per update; checks and alerts reuse the fix timestamp
         current_location = LocationData(
             lat=lat,
             lng=lng,
-            timestamp=datetime.now(),
+            timestamp=timestamp or datetime.now(),
             speed=speed,
             accuracy=accuracy
         )
         
-        self.user_location_history.append(current_location)
-        
-        # Keep only last 100 locations
-        if len(self.user_location_history) > 100:
-            self.user_location_history = self.user_location_history[-100:]
+        self._append_history(current_location)
         
         # Check for anomalies
         anomaly_detected = self._detect_anomalies(current_location)
@@ -109,9 +152,29 @@ class DynamicGeofencing:
         
         return anomaly_detected
     
+    def _append_history(self, location: LocationData):
+        """Write a location into the history ring buffer"""
+        slot = self._hist_head
+        self._hist_lat[slot] = location.lat
+        self._hist_lng[slot] = location.lng
+        self._hist_speed[slot] = location.speed
+        self._hist_accuracy[slot] = location.accuracy
+        self._hist_ts[slot] = location.timestamp.timestamp()
+        lat_r = math.radians(location.lat)
+        self._hist_sin_lat[slot] = math.sin(lat_r)
+        self._hist_cos_lat[slot] = math.cos(lat_r)
+        
+        self._hist_head = (slot + 1) % self.history_size
+        self._hist_count = min(self._hist_count + 1, self.history_size)
+    
+    def _history_slots(self, n: int) -> np.ndarray:
+        """Ring buffer slots of the last n locations, oldest first"""
+        n = min(n, self._hist_count)
+        return (self._hist_head - n + np.arange(n)) % self.history_size
+    
     def _detect_anomalies(self, current_location: LocationData) -> bool:
         """Detect behavioral anomalies"""
-        if len(self.user_location_history) < 2:
+        if self._hist_count < 2:
             return False
         
         # Check if user has stopped in a low-safety area
@@ -134,17 +197,13 @@ class DynamicGeofencing:
             return False
         
         # Get safety score for current location
-        if self.safety_model:
-            safety_score = self.safety_model.predict_safety_score(
-                current_location.lat, 
-                current_location.lng
-            )
-        else:
-            safety_score = 50
+        safety_score = self._lookup_zone_score(
+            current_location.lat, current_location.lng, current_location.timestamp
+        )
         
         # Check if stopped for too long in unsafe area
         if safety_score < self.safety_score_threshold:
-            stopped_duration = self._get_stopped_duration()
+            stopped_duration = self._get_stopped_duration(current_location.timestamp)
             if stopped_duration > self.anomaly_threshold:
                 return True
         
@@ -152,83 +211,117 @@ class DynamicGeofencing:
     
     def _has_deviated_from_route(self, current_location: LocationData) -> bool:
         """Check if user has deviated significantly from planned route"""
-        if not self.planned_route:
+        if self._route_lat.size == 0:
             return False
         
-        # Find closest point on planned route
-        min_distance = float('inf')
-        for route_lat, route_lng in self.planned_route:
-            distance = self._calculate_distance(
-                current_location.lat, current_location.lng,
-                route_lat, route_lng
-            )
-            min_distance = min(min_distance, distance)
-        
         # If more than 200m from planned route, consider it a deviation
-        return min_distance > 200
+        threshold = 200
+        
+        # Equirectangular distances (mul/add only) settle all but borderline
+        # cases; within a 1% band of the threshold, fall back to haversine
+        lat_r = math.radians(current_location.lat)
+        dx = (self._route_lng - math.radians(current_location.lng)) * math.cos(lat_r)
+        dy = self._route_lat - lat_r
+        min_distance = 6371000 * math.sqrt((dx * dx + dy * dy).min())
+        if abs(min_distance - threshold) > 0.01 * threshold:
+            return min_distance > threshold
+        
+        a = self._route_haversine_terms(current_location.lat, current_location.lng)
+        min_distance = 2 * 6371000 * np.arcsin(np.sqrt(a.min()))
+        return min_distance > threshold
+    
+    def _route_haversine_terms(self, lat: float, lng: float) -> np.ndarray:
+        """Haversine 'a' term from a point to every route point at once"""
+        lat_r = math.radians(lat)
+        # sin^2(x/2) = (1 - cos x)/2 folds the haversine into one cos per
+        # route point, reusing the route's precomputed latitude trig
+        a = (1 - math.sin(lat_r) * self._sin_route_lat -
+             math.cos(lat_r) * self._cos_route_lat *
+             np.cos(self._route_lng - math.radians(lng))) / 2
+        return np.clip(a, 0.0, 1.0)
+    
+    def _lookup_zone_score(self, lat: float, lng: float, now: datetime = None) -> float:
+        """Safety score of the enclosing route zone, predicting only off-route"""
+        if self._zone_scores.size:
+            a = self._route_haversine_terms(lat, lng)
+            nearest = int(a.argmin())
+            distance = 2 * 6371000 * np.arcsin(np.sqrt(a[nearest]))
+            if distance <= self._zone_radius[nearest]:
+                return float(self._zone_scores[nearest])
+        
+        if self.safety_model:
+            # Bucket on the fix's own wall-clock hour; epoch-hour buckets
+            # start on UTC hours, which split local hours in :30 timezones
+            hour_start = (now or datetime.now()).replace(
+                minute=0, second=0, microsecond=0, tzinfo=None
+            )
+            return self._grid_score(
+                int(round(lat * self.score_grid_scale)),
+                int(round(lng * self.score_grid_scale)),
+                hour_start
+            )
+        return 50
+    
+    def _predict_grid_score(self, lat_i: int, lng_i: int, hour_start: datetime) -> float:
+        """Model safety score at a grid cell centre for a given clock hour"""
+        return self.safety_model.predict_safety_score(
+            lat_i / self.score_grid_scale,
+            lng_i / self.score_grid_scale,
+            hour_start
+        )
     
     def _has_unusual_movement_pattern(self, current_location: LocationData) -> bool:
         """Check for unusual movement patterns"""
-        if len(self.user_location_history) < 5:
+        if self._hist_count < 5:
             return False
         
         # Check for erratic movement (rapid direction changes)
-        recent_locations = self.user_location_history[-5:]
-        direction_changes = 0
+        recent = self._history_slots(5)
+        sin_lat = self._hist_sin_lat[recent]
+        cos_lat = self._hist_cos_lat[recent]
         
-        for i in range(1, len(recent_locations) - 1):
-            prev_bearing = self._calculate_bearing(
-                recent_locations[i-1].lat, recent_locations[i-1].lng,
-                recent_locations[i].lat, recent_locations[i].lng
-            )
-            curr_bearing = self._calculate_bearing(
-                recent_locations[i].lat, recent_locations[i].lng,
-                recent_locations[i+1].lat, recent_locations[i+1].lng
-            )
-            
-            bearing_diff = abs(curr_bearing - prev_bearing)
-            if bearing_diff > 180:
-                bearing_diff = 360 - bearing_diff
-            
-            if bearing_diff > 90:  # Significant direction change
-                direction_changes += 1
+        # Bearings of the 4 consecutive legs in one pass
+        dlng = np.radians(np.diff(self._hist_lng[recent]))
+        y = np.sin(dlng) * cos_lat[1:]
+        x = (cos_lat[:-1] * sin_lat[1:] -
+             sin_lat[:-1] * cos_lat[1:] * np.cos(dlng))
+        bearings = np.degrees(np.arctan2(y, x)) % 360
+        
+        bearing_diff = np.abs(np.diff(bearings))
+        bearing_diff = np.minimum(bearing_diff, 360 - bearing_diff)
+        
+        # Significant direction changes (> 90 degrees)
+        direction_changes = int((bearing_diff > 90).sum())
         
         # If more than 2 significant direction changes in 5 movements
         return direction_changes > 2
     
-    def _get_stopped_duration(self) -> float:
+    def _get_stopped_duration(self, now: datetime = None) -> float:
         """Get duration user has been stopped (in minutes)"""
-        if len(self.user_location_history) < 2:
+        if self._hist_count < 2:
             return 0
         
-        stopped_start = None
-        for location in reversed(self.user_location_history):
-            if location.speed <= self.speed_threshold:
-                if stopped_start is None:
-                    stopped_start = location.timestamp
-            else:
-                break
+        # Walk back from the newest fix to the start of the stopped run
+        slots = self._history_slots(self._hist_count)[::-1]
+        moving = self._hist_speed[slots] > self.speed_threshold
+        run_length = int(np.argmax(moving)) if moving.any() else len(slots)
         
-        if stopped_start:
-            return (datetime.now() - stopped_start).total_seconds() / 60
+        if run_length:
+            stopped_start = float(self._hist_ts[slots[run_length - 1]])
+            return ((now or datetime.now()).timestamp() - stopped_start) / 60
         
         return 0
     
     def _handle_anomaly(self, current_location: LocationData):
         """Handle detected anomaly"""
-        if self.current_phase == AlertPhase.NORMAL:
-            self.current_phase = AlertPhase.SOFT_CHECK
-            self._trigger_soft_check_alert(current_location)
-        elif self.current_phase == AlertPhase.SOFT_CHECK:
-            # Check if user responded to soft check
-            if not self._user_responded_to_soft_check():
-                self.current_phase = AlertPhase.ESCALATION
-                self._trigger_escalation_alert(current_location)
-        elif self.current_phase == AlertPhase.ESCALATION:
-            # Check if user responded to escalation
-            if not self._user_responded_to_escalation():
-                self.current_phase = AlertPhase.EMERGENCY
-                self._trigger_emergency_alert(current_location)
+        transition = self._transitions.get(self.current_phase)
+        if transition is None:
+            return
+        
+        next_phase, trigger_alert, user_responded = transition
+        if user_responded is None or not user_responded():
+            self.current_phase = next_phase
+            trigger_alert(current_location)
     
     def _trigger_soft_check_alert(self, current_location: LocationData):
         """Trigger soft check alert"""
@@ -239,7 +332,7 @@ class DynamicGeofencing:
                 "lat": current_location.lat,
                 "lng": current_location.lng
             },
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": current_location.timestamp.isoformat(),
             "actions": [
                 "Tap to confirm you're okay",
                 "Hold for 3 seconds to alert emergency contacts"
@@ -258,7 +351,7 @@ class DynamicGeofencing:
                 "lat": current_location.lat,
                 "lng": current_location.lng
             },
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": current_location.timestamp.isoformat(),
             "sakha_ready": True,
             "emergency_contacts_prepared": True
         }
@@ -275,11 +368,11 @@ class DynamicGeofencing:
                 "lat": current_location.lat,
                 "lng": current_location.lng
             },
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": current_location.timestamp.isoformat(),
             "emergency_contacts_notified": True,
             "police_alerted": True,
-            "safety_score": self.safety_model.predict_safety_score(
-                current_location.lat, current_location.lng
+            "safety_score": self._lookup_zone_score(
+                current_location.lat, current_location.lng, current_location.timestamp
             ) if self.safety_model else 0
         }
         
@@ -296,42 +389,21 @@ class DynamicGeofencing:
         # In real implementation, this would check user interaction
         return False  # Simulate no response for testing
     
-    def _calculate_distance(self, lat1: float, lng1: float, lat2: float, lng2: float) -> float:
-        """Calculate distance between two points in meters"""
-        R = 6371000  # Earth's radius in meters
-        dlat = np.radians(lat2 - lat1)
-        dlng = np.radians(lng2 - lng1)
-        a = (np.sin(dlat/2) * np.sin(dlat/2) + 
-             np.cos(np.radians(lat1)) * np.cos(np.radians(lat2)) * 
-             np.sin(dlng/2) * np.sin(dlng/2))
-        c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
-        return R * c
-    
-    def _calculate_bearing(self, lat1: float, lng1: float, lat2: float, lng2: float) -> float:
-        """Calculate bearing between two points"""
-        dlat = np.radians(lat2 - lat1)
-        dlng = np.radians(lng2 - lng1)
-        
-        y = np.sin(dlng) * np.cos(np.radians(lat2))
-        x = (np.cos(np.radians(lat1)) * np.sin(np.radians(lat2)) - 
-             np.sin(np.radians(lat1)) * np.cos(np.radians(lat2)) * np.cos(dlng))
-        
-        bearing = np.degrees(np.arctan2(y, x))
-        return (bearing + 360) % 360
-    
     def get_current_safety_status(self) -> Dict:
         """Get current safety status"""
-        if not self.user_location_history:
-            return {"status": "no_location_data"}
+        if self._hist_count == 0:
+            return {"status": "no_location_data", "stopped_duration": 0}
         
-        current_location = self.user_location_history[-1]
+        slot = (self._hist_head - 1) % self.history_size
+        current_location = LocationData(
+            lat=float(self._hist_lat[slot]),
+            lng=float(self._hist_lng[slot]),
+            timestamp=datetime.fromtimestamp(self._hist_ts[slot]),
+            speed=float(self._hist_speed[slot]),
+            accuracy=float(self._hist_accuracy[slot])
+        )
         
-        if self.safety_model:
-            safety_score = self.safety_model.predict_safety_score(
-                current_location.lat, current_location.lng
-            )
-        else:
-            safety_score = 50
+        safety_score = self._lookup_zone_score(current_location.lat, current_location.lng)
         
         return {
             "current_phase": self.current_phase.value,
@@ -3,9 +3,15 @@ import json
 from datetime import datetime, timedelta
 from typing import List, Dict, Tuple, Optional
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dataclasses import dataclass
+from functools import lru_cache
 
-@dataclass
+from compat import DATACLASS_SLOTS
+from geofence_kernels import EARTH_RADIUS_M, haversine_distance
+
+@dataclass(**DATACLASS_SLOTS)
 class RoutePoint:
     lat: float
     lng: float
@@ -15,16 +21,52 @@ class RoutePoint:
 
 @dataclass
 class OptimizedRoute:
-    points: List[RoutePoint]
+    # Route points as parallel arrays, one entry per point
+    lats: np.ndarray
+    lngs: np.ndarray
+    safety_scores: np.ndarray
+    travel_times: np.ndarray  # minutes
+    timestamps: np.ndarray  # datetime64[us]
     total_safety_score: float
     total_travel_time: float
     route_confidence: float
+    
+    @property
+    def points(self) -> List[RoutePoint]:
+        """Route points as RoutePoint records (built on each access)"""
+        return [
+            RoutePoint(
+                lat=lat,
+                lng=lng,
+                safety_score=safety_score,
+                timestamp=timestamp,
+                estimated_travel_time=travel_time
+            )
+            for lat, lng, safety_score, timestamp, travel_time in zip(
+                self.lats.tolist(), self.lngs.tolist(), self.safety_scores.tolist(),
+                self.timestamps.tolist(), self.travel_times.tolist()
+            )
+        ]
 
 class EnhancedRouteOptimizer:
     def __init__(self, safety_model=None, google_maps_api_key=None):
         self.safety_model = safety_model
         self.google_maps_api_key = google_maps_api_key
-        self.route_cache = {}
+        self.max_http_workers = 20  # pooled connections for concurrent request threads
+        
+        # Pooled keep-alive connections to the Maps API, reused across calls
+        self._session = requests.Session()
+        self._session.mount('https://', HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=self.max_http_workers,
+            max_retries=Retry(total=3, backoff_factor=0.3,
+                              status_forcelist=(500, 502, 503, 504))
+        ))
+        
+        # Directions results memoized per ~11m origin/destination cell and
+        # 15-minute departure bucket; failed requests are not cached
+        self.route_cache_bucket = 15 * 60  # seconds
+        self.route_cache = lru_cache(maxsize=4096)(self._fetch_route_alternatives)
         
     def optimize_route_with_safety_scoring(self, 
                                          start_lat: float, 
@@ -41,9 +83,18 @@ class EnhancedRouteOptimizer:
         
         # Get multiple route alternatives from Google Maps
         route_alternatives = self._get_route_alternatives(
-            start_lat, start_lng, end_lat, end_lng, max_alternatives
+            start_lat, start_lng, end_lat, end_lng, max_alternatives, departure_time
         )
         
+        return self._optimize_alternatives(
+            start_lat, start_lng, end_lat, end_lng, route_alternatives, departure_time
+        )
+    
+    def _optimize_alternatives(self, start_lat: float, start_lng: float,
+                               end_lat: float, end_lng: float,
+                               route_alternatives: List[Dict],
+                               departure_time: datetime) -> OptimizedRoute:
+        """Score route alternatives and pick the best one"""
         if not route_alternatives:
             return self._create_fallback_route(start_lat, start_lng, end_lat, end_lng)
         
@@ -63,35 +114,49 @@ class EnhancedRouteOptimizer:
     
     def _get_route_alternatives(self, start_lat: float, start_lng: float, 
                                end_lat: float, end_lng: float, 
-                               max_alternatives: int) -> List[Dict]:
+                               max_alternatives: int,
+                               departure_time: Optional[datetime] = None) -> List[Dict]:
         """Get route alternatives from Google Maps API"""
         if not self.google_maps_api_key:
             return self._get_mock_routes(start_lat, start_lng, end_lat, end_lng)
         
+        if departure_time is None:
+            departure_time = datetime.now()
+        
         try:
-            url = "https://maps.googleapis.com/maps/api/directions/json"
-            params = {
-                'origin': f"{start_lat},{start_lng}",
-                'destination': f"{end_lat},{end_lng}",
-                'alternatives': 'true',
-                'mode': 'driving',
-                'avoid': 'highways',
-                'key': self.google_maps_api_key
-            }
-            
-            response = requests.get(url, params=params)
-            data = response.json()
-            
-            if data['status'] == 'OK':
-                return data['routes'][:max_alternatives]
-            else:
-                print(f"Google Maps API error: {data['status']}")
-                return self._get_mock_routes(start_lat, start_lng, end_lat, end_lng)
-                
+            return list(self.route_cache(
+                round(start_lat, 4), round(start_lng, 4),
+                round(end_lat, 4), round(end_lng, 4),
+                max_alternatives,
+                int(departure_time.timestamp() // self.route_cache_bucket)
+            ))
         except Exception as e:
             print(f"Error getting routes from Google Maps: {e}")
             return self._get_mock_routes(start_lat, start_lng, end_lat, end_lng)
     
+    def _fetch_route_alternatives(self, start_lat: float, start_lng: float,
+                                  end_lat: float, end_lng: float,
+                                  max_alternatives: int, time_bucket: int) -> List[Dict]:
+        """Request route alternatives from the Directions API (memoized through
+        route_cache; time_bucket only keys the cache)"""
+        url = "https://maps.googleapis.com/maps/api/directions/json"
+        params = {
+            'origin': f"{start_lat},{start_lng}",
+            'destination': f"{end_lat},{end_lng}",
+            'alternatives': 'true',
+            'mode': 'driving',
+            'avoid': 'highways',
+            'key': self.google_maps_api_key
+        }
+        
+        response = self._session.get(url, params=params, timeout=5)
+        data = response.json()
+        
+        if data['status'] != 'OK':
+            raise RuntimeError(f"Google Maps API error: {data['status']}")
+        
+        return data['routes'][:max_alternatives]
+    
     def _get_mock_routes(self, start_lat: float, start_lng: float, 
                         end_lat: float, end_lng: float) -> List[Dict]:
         """Generate mock routes for testing with realistic travel times"""
@@ -125,56 +190,45 @@ class EnhancedRouteOptimizer:
     
     def _calculate_route_safety_scores(self, route: Dict, departure_time: datetime) -> OptimizedRoute:
         """Calculate safety scores for each point in the route"""
-        points = []
-        current_time = departure_time
-        total_safety_score = 0
-        total_travel_time = 0
-        
-        for step in route['legs'][0]['steps']:
-            start_lat = step['start_location']['lat']
-            start_lng = step['start_location']['lng']
-            
-            # Calculate safety score for this point
-            if self.safety_model:
-                safety_score = self.safety_model.predict_safety_score(
-                    start_lat, start_lng, current_time
-                )
-            else:
-                safety_score = 50  # Default score
-            
-            # Calculate travel time for this step
-            step_duration = step['duration']['value'] / 60  # Convert to minutes
-            
-            # Create route point
-            route_point = RoutePoint(
-                lat=start_lat,
-                lng=start_lng,
-                safety_score=safety_score,
-                timestamp=current_time,
-                estimated_travel_time=step_duration
+        steps = route['legs'][0]['steps']
+        start_lats = np.array([step['start_location']['lat'] for step in steps], dtype=np.float64)
+        start_lngs = np.array([step['start_location']['lng'] for step in steps], dtype=np.float64)
+        step_durations = np.array(
+            [step['duration']['value'] for step in steps], dtype=np.float64
+        ) / 60  # minutes
+        
+        # Each step starts once the previous steps have been travelled; an
+        # aware departure keeps its own wall-clock fields (datetime64 would
+        # shift it to UTC), as the per-point .hour features read them
+        elapsed_minutes = np.concatenate([[0.0], np.cumsum(step_durations)[:-1]])
+        step_times = (np.datetime64(departure_time.replace(tzinfo=None), 'us') +
+                      np.round(elapsed_minutes * 60e6).astype('timedelta64[us]'))
+        
+        # Score every step start in one model call
+        if self.safety_model and steps:
+            safety_scores = self.safety_model.predict_safety_score_batch(
+                start_lats, start_lngs, step_times
             )
-            
-            points.append(route_point)
-            total_safety_score += safety_score
-            total_travel_time += step_duration
-            
-            # Update time for next step
-            current_time += timedelta(minutes=step_duration)
+        else:
+            safety_scores = np.full(len(steps), 50.0)  # Default score
         
         # Calculate route confidence based on safety score consistency
-        safety_scores = [point.safety_score for point in points]
         route_confidence = self._calculate_route_confidence(safety_scores)
         
         return OptimizedRoute(
-            points=points,
-            total_safety_score=total_safety_score,
-            total_travel_time=total_travel_time,
+            lats=start_lats,
+            lngs=start_lngs,
+            safety_scores=np.asarray(safety_scores, dtype=np.float64),
+            travel_times=step_durations,
+            timestamps=step_times,
+            total_safety_score=float(np.sum(safety_scores)),
+            total_travel_time=float(step_durations.sum()),
             route_confidence=route_confidence
         )
     
-    def _calculate_route_confidence(self, safety_scores: List[float]) -> float:
+    def _calculate_route_confidence(self, safety_scores: np.ndarray) -> float:
         """Calculate confidence in route safety based on score consistency"""
-        if not safety_scores:
+        if len(safety_scores) == 0:
             return 0.0
         
         # Higher confidence for consistent high scores
@@ -194,48 +248,33 @@ class EnhancedRouteOptimizer:
         if not routes:
             return None
         
-        # Calculate composite score for each route
-        route_scores = []
+        # Per-route aggregates as arrays
+        total_safety = np.array([route.total_safety_score for route in routes], dtype=np.float64)
+        total_time = np.array([route.total_travel_time for route in routes], dtype=np.float64)
+        n_points = np.array([len(route.lats) for route in routes], dtype=np.float64)
         
-        for route in routes:
-            # Normalize safety score (0-1)
-            normalized_safety = route.total_safety_score / (len(route.points) * 100)
-            
-            # Normalize travel time (inverse relationship - shorter is better)
-            # Assuming max reasonable travel time is 60 minutes
-            normalized_time = max(0, 1 - (route.total_travel_time / 60))
-            
-            # Weighted composite score
-            composite_score = (normalized_safety * 0.7) + (normalized_time * 0.3)
-            
-            route_scores.append(composite_score)
+        # Normalize safety score (0-1)
+        normalized_safety = total_safety / (n_points * 100)
+        
+        # Normalize travel time (inverse relationship - shorter is better)
+        # Assuming max reasonable travel time is 60 minutes
+        normalized_time = np.maximum(0, 1 - (total_time / 60))
         
-        # Select route with highest composite score
-        best_route_index = np.argmax(route_scores)
-        return routes[best_route_index]
+        # Weighted composite score; select route with the highest
+        composite_scores = (normalized_safety * 0.7) + (normalized_time * 0.3)
+        return routes[int(np.argmax(composite_scores))]
     
     def _create_fallback_route(self, start_lat: float, start_lng: float, 
                               end_lat: float, end_lng: float) -> OptimizedRoute:
         """Create a simple fallback route"""
-        points = [
-            RoutePoint(
-                lat=start_lat,
-                lng=start_lng,
-                safety_score=50,
-                timestamp=datetime.now(),
-                estimated_travel_time=0
-            ),
-            RoutePoint(
-                lat=end_lat,
-                lng=end_lng,
-                safety_score=50,
-                timestamp=datetime.now() + timedelta(minutes=30),
-                estimated_travel_time=30
-            )
-        ]
+        now = datetime.now()
         
         return OptimizedRoute(
-            points=points,
+            lats=np.array([start_lat, end_lat], dtype=np.float64),
+            lngs=np.array([start_lng, end_lng], dtype=np.float64),
+            safety_scores=np.array([50.0, 50.0]),
+            travel_times=np.array([0.0, 30.0]),
+            timestamps=np.array([now, now + timedelta(minutes=30)], dtype='datetime64[us]'),
             total_safety_score=100,
             total_travel_time=30,
             route_confidence=0.5
@@ -247,16 +286,11 @@ class EnhancedRouteOptimizer:
         current_lat, current_lng = current_location
         
         # Find closest point on route
-        closest_point = None
-        min_distance = float('inf')
-        
-        for point in route.points:
-            distance = self._calculate_distance(
-                current_lat, current_lng, point.lat, point.lng
-            )
-            if distance < min_distance:
-                min_distance = distance
-                closest_point = point
+        closest_index, min_distance = self._closest_point_index(route, current_lat, current_lng)
+        if closest_index is None:
+            planned_safety_score = 50
+        else:
+            planned_safety_score = float(route.safety_scores[closest_index])
         
         # Get current safety score
         if self.safety_model:
@@ -267,11 +301,11 @@ class EnhancedRouteOptimizer:
             current_safety_score = 50
         
         # Calculate safety trend
-        safety_trend = self._calculate_safety_trend(route, current_location)
+        safety_trend = self._calculate_safety_trend(route, closest_index or 0)
         
         return {
             "current_safety_score": current_safety_score,
-            "planned_safety_score": closest_point.safety_score if closest_point else 50,
+            "planned_safety_score": planned_safety_score,
             "safety_trend": safety_trend,
             "distance_from_route": min_distance,
             "recommendations": self._generate_safety_recommendations(
@@ -279,31 +313,25 @@ class EnhancedRouteOptimizer:
             )
         }
     
-    def _calculate_safety_trend(self, route: OptimizedRoute, 
-                              current_location: Tuple[float, float]) -> str:
-        """Calculate safety trend for upcoming route"""
-        current_lat, current_lng = current_location
-        
-        # Find current position in route
-        current_index = 0
-        min_distance = float('inf')
-        
-        for i, point in enumerate(route.points):
-            distance = self._calculate_distance(
-                current_lat, current_lng, point.lat, point.lng
-            )
-            if distance < min_distance:
-                min_distance = distance
-                current_index = i
-        
+    def _closest_point_index(self, route: OptimizedRoute,
+                             lat: float, lng: float) -> Tuple[Optional[int], float]:
+        """Index of and distance to the route point closest to a location"""
+        if len(route.lats) == 0:
+            return None, float('inf')
+        
+        distances = self._calculate_distances(lat, lng, route.lats, route.lngs)
+        closest_index = int(np.argmin(distances))
+        return closest_index, float(distances[closest_index])
+    
+    def _calculate_safety_trend(self, route: OptimizedRoute, current_index: int) -> str:
+        """Calculate safety trend for upcoming route from the current position"""
         # Calculate average safety score for remaining route
-        remaining_points = route.points[current_index:]
-        if len(remaining_points) < 2:
+        remaining_scores = route.safety_scores[current_index:]
+        if len(remaining_scores) < 2:
             return "stable"
         
-        remaining_scores = [point.safety_score for point in remaining_points]
-        avg_remaining = np.mean(remaining_scores)
-        current_score = remaining_scores[0] if remaining_scores else 50
+        avg_remaining = remaining_scores.mean()
+        current_score = remaining_scores[0]
         
         if avg_remaining > current_score + 10:
             return "improving"
@@ -334,14 +362,17 @@ class EnhancedRouteOptimizer:
     
     def _calculate_distance(self, lat1: float, lng1: float, lat2: float, lng2: float) -> float:
         """Calculate distance between two points in meters"""
-        R = 6371000  # Earth's radius in meters
-        dlat = np.radians(lat2 - lat1)
-        dlng = np.radians(lng2 - lng1)
-        a = (np.sin(dlat/2) * np.sin(dlat/2) + 
-             np.cos(np.radians(lat1)) * np.cos(np.radians(lat2)) * 
-             np.sin(dlng/2) * np.sin(dlng/2))
-        c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
-        return R * c
+        return haversine_distance(lat1, lng1, lat2, lng2)
+    
+    def _calculate_distances(self, lat: float, lng: float, lats, lngs) -> np.ndarray:
+        """Calculate distances in meters from one point to many points at once"""
+        lat_r = np.radians(lat)
+        lats_r = np.radians(np.asarray(lats, dtype=np.float64))
+        dlat = lats_r - lat_r
+        dlng = np.radians(np.asarray(lngs, dtype=np.float64) - lng)
+        a = (np.sin(dlat/2) ** 2 +
+             np.cos(lat_r) * np.cos(lats_r) * np.sin(dlng/2) ** 2)
+        return EARTH_RADIUS_M * 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
 
 # Example usage
 if __name__ == "__main__":
@@ -0,0 +1,47 @@
+"""
+Forest Predictor - flattened random forest inference
+Packs every tree of a fitted scikit-learn forest regressor into shared node
+arrays and walks all trees one level at a time with NumPy, skipping sklearn's
+per-call validation and per-tree dispatch on small batches
+"""
+
+import numpy as np
+
+class FlattenedForest:
+    def __init__(self, forest):
+        """Flatten the trees of a fitted forest regressor (single output)"""
+        trees = [estimator.tree_ for estimator in forest.estimators_]
+        offsets = np.cumsum([0] + [tree.node_count for tree in trees[:-1]])
+
+        left, right, feature, threshold, value = [], [], [], [], []
+        for tree, offset in zip(trees, offsets):
+            node_ids = np.arange(tree.node_count) + offset
+            is_leaf = tree.children_left == -1
+
+            # Leaves point back at themselves so extra levels are no-ops
+            left.append(np.where(is_leaf, node_ids, tree.children_left + offset))
+            right.append(np.where(is_leaf, node_ids, tree.children_right + offset))
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(tree.threshold)
+            value.append(tree.value[:, 0, 0])
+
+        self.roots = offsets.astype(np.intp)
+        self.left = np.concatenate(left).astype(np.intp)
+        self.right = np.concatenate(right).astype(np.intp)
+        self.feature = np.concatenate(feature).astype(np.intp)
+        self.threshold = np.concatenate(threshold)
+        self.value = np.concatenate(value)
+        self.max_depth = max(tree.max_depth for tree in trees)
+
+    def predict(self, X):
+        """Average tree prediction for each row of X"""
+        # Trees split on float32 inputs, as in scikit-learn
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))[:, None]
+        nodes = np.tile(self.roots, (len(X), 1))
+
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+
+        return self.value[nodes].mean(axis=1)
@@ -0,0 +1,19 @@
+"""
+Geofence Kernels - scalar great-circle distance
+Plain math-module haversine for the route optimizer's single-point
+distance calls, where NumPy's per-call dispatch outweighs the math
+"""
+
+import math
+
+EARTH_RADIUS_M = 6371000.0  # Earth's radius in meters
+
+def haversine_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Calculate distance between two points in meters"""
+    dlat = math.radians(lat2 - lat1)
+    dlng = math.radians(lng2 - lng1)
+    a = (math.sin(dlat/2) * math.sin(dlat/2) +
+         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
+         math.sin(dlng/2) * math.sin(dlng/2))
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+    return EARTH_RADIUS_M * c
@@ -1,29 +1,69 @@
 import numpy as np
 import pandas as pd
+import math
 import json
-from datetime import datetime, timedelta
+from datetime import datetime
 import requests
+from scipy.spatial import cKDTree
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 import joblib
 import os
+from functools import lru_cache
+
+from forest_predictor import FlattenedForest
+
+# Trained model shipped with the repository (models/ at the project root)
+DEFAULT_MODEL_PATH = os.path.normpath(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir, 'models', 'safety_model.pkl'
+))
+
+@lru_cache(maxsize=4096)
+def _time_features(hour, weekday, month):
+    """Time feature values for an (hour, weekday, month) triple"""
+    return hour, weekday, month, 1 if weekday >= 5 else 0
 
 class PredictiveSafetyModel:
-    def __init__(self):
+    def __init__(self, model_path=DEFAULT_MODEL_PATH):
+        self.model_path = model_path
         self.model = None
+        self._forest = None  # flattened copy of self.model used for prediction
         self.scaler = StandardScaler()
+        # Scaler mean and 1/scale, for the inlined transform
+        self._scaler_mean = None
+        self._scaler_inv_scale = None
         self.feature_columns = [
             'hour_of_day', 'day_of_week', 'month', 'is_weekend',
             'crime_density', 'lighting_score', 'traffic_density', 
             'business_density', 'population_density', 'historical_crime_score'
         ]
         
+        # Simulated density maps: fixed random tiles indexed by ~1km cell, so a
+        # location always gets the same density
+        self.density_grid_size = 1024
+        grid_rng = np.random.default_rng(42)
+        grid_shape = (self.density_grid_size, self.density_grid_size)
+        self._business_grid = grid_rng.uniform(20, 80, grid_shape).astype(np.float32)
+        self._population_grid = grid_rng.uniform(30, 90, grid_shape).astype(np.float32)
+        
+        # Nearest-crime KD-tree and aligned scores, built once per DataFrame
+        self._crime_source = None
+        self._crime_tree = None
+        self._crime_scores = np.empty(0)
+        
+        # Load the trained model up front; prediction never trains lazily
+        self.load_model(model_path)
+        
     def load_historical_data(self, crime_data_path='../data/crime.csv'):
-        """Load and preprocess historical crime data"""
+        """Load and preprocess historical crime data into column arrays
+        ('lat', 'long' and, when present, 'crime/area')"""
         try:
             df = pd.read_csv(crime_data_path)
-            return df
+            return {
+                column: df[column].to_numpy(dtype=np.float64)
+                for column in ('lat', 'long', 'crime/area') if column in df
+            }
         except Exception as e:
             print(f"Error loading crime data: {e}")
             return None
@@ -33,11 +73,14 @@ class PredictiveSafetyModel:
         if timestamp is None:
             timestamp = datetime.now()
         
+        hour, weekday, month, is_weekend = _time_features(
+            timestamp.hour, timestamp.weekday(), timestamp.month
+        )
         return {
-            'hour_of_day': timestamp.hour,
-            'day_of_week': timestamp.weekday(),
-            'month': timestamp.month,
-            'is_weekend': 1 if timestamp.weekday() >= 5 else 0
+            'hour_of_day': hour,
+            'day_of_week': weekday,
+            'month': month,
+            'is_weekend': is_weekend
         }
     
     def get_lighting_score(self, lat, lng, hour):
@@ -74,32 +117,73 @@ class PredictiveSafetyModel:
             
         return min(100, base_traffic * traffic_multiplier)
     
+    def _density_cell(self, lat, lng):
+        """Density grid cell (row, col) for a single location"""
+        return (int(math.floor(lat * 100)) % self.density_grid_size,
+                int(math.floor(lng * 100)) % self.density_grid_size)
+    
+    def _density_cells(self, lats, lngs):
+        """Density grid cell rows and cols for many locations"""
+        return (np.floor(lats * 100).astype(np.int64) % self.density_grid_size,
+                np.floor(lngs * 100).astype(np.int64) % self.density_grid_size)
+    
     def get_business_density(self, lat, lng):
         """Get business density score"""
         # Simulate business density - in real implementation, use Google Places API
         # Higher business density = more lighting, people, safety
-        return np.random.uniform(20, 80)
+        return float(self._business_grid[self._density_cell(lat, lng)])
     
     def get_population_density(self, lat, lng):
         """Get population density score"""
         # Simulate population density
-        return np.random.uniform(30, 90)
+        return float(self._population_grid[self._density_cell(lat, lng)])
+    
+    def _crime_index(self, crime_data):
+        """KD-tree over crime coordinates and the matching crime scores;
+        crime_data maps column names to arrays (or is a DataFrame)"""
+        if self._crime_source is not crime_data:
+            coords = np.column_stack([
+                np.asarray(crime_data['lat'], dtype=np.float64),
+                np.asarray(crime_data['long'], dtype=np.float64)
+            ])
+            if 'crime/area' in crime_data:
+                scores = np.asarray(crime_data['crime/area'], dtype=np.float64)
+            else:
+                scores = np.full(len(coords), 5.0)
+            
+            # Rows without coordinates can never be the closest point
+            valid = ~np.isnan(coords).any(axis=1)
+            self._crime_tree = cKDTree(coords[valid]) if valid.any() else None
+            self._crime_scores = scores[valid]
+            self._crime_source = crime_data
+        
+        return self._crime_tree, self._crime_scores
     
     def get_historical_crime_score(self, lat, lng, crime_data):
         """Calculate historical crime score for location"""
-        # Find closest crime data point
-        min_distance = float('inf')
+        crime_tree, crime_scores = self._crime_index(crime_data)
         closest_crime_score = 5  # Default high risk
         
-        for _, row in crime_data.iterrows():
-            distance = np.sqrt((lat - row['lat'])**2 + (lng - row['long'])**2)
-            if distance < min_distance:
-                min_distance = distance
-                closest_crime_score = row.get('crime/area', 5)
+        # Find closest crime data point
+        if crime_tree is not None:
+            _, nearest = crime_tree.query([lat, lng], k=1)
+            closest_crime_score = crime_scores[nearest]
         
         # Convert to 0-100 scale (lower is safer)
         return max(0, min(100, 100 - (closest_crime_score * 10)))
     
+    def get_historical_crime_scores(self, lats, lngs, crime_data):
+        """Historical crime scores for many locations with one tree query"""
+        crime_tree, crime_scores = self._crime_index(crime_data)
+        closest_crime_scores = np.full(len(lats), 5.0)  # Default high risk
+        
+        if crime_tree is not None and len(lats):
+            _, nearest = crime_tree.query(np.column_stack([lats, lngs]), k=1)
+            closest_crime_scores = crime_scores[nearest]
+        
+        # Convert to 0-100 scale (lower is safer)
+        return np.clip(100 - (closest_crime_scores * 10), 0, 100)
+    
     def create_feature_vector(self, lat, lng, timestamp=None, crime_data=None):
         """Create feature vector for prediction"""
         if timestamp is None:
@@ -121,6 +205,65 @@ class PredictiveSafetyModel:
         
         return features
     
+    def create_feature_matrix(self, lats, lngs, timestamps=None, crime_data=None):
+        """Create an (n, features) float32 array for many locations, columns in
+        feature_columns order; timestamps is one datetime, one per location,
+        or a datetime64 array"""
+        lats = np.asarray(lats, dtype=np.float64)
+        lngs = np.asarray(lngs, dtype=np.float64)
+        n = len(lats)
+        
+        if timestamps is None:
+            timestamps = datetime.now()
+        if isinstance(timestamps, datetime):
+            timestamps = [timestamps] * n
+        
+        if isinstance(timestamps, np.ndarray) and np.issubdtype(timestamps.dtype, np.datetime64):
+            days = timestamps.astype('datetime64[D]')
+            hour = (timestamps.astype('datetime64[h]') - days).astype(int)
+            day_of_week = (days.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+            month = timestamps.astype('datetime64[M]').astype(np.int64) % 12 + 1
+        else:
+            hour = np.array([t.hour for t in timestamps])
+            day_of_week = np.array([t.weekday() for t in timestamps])
+            month = np.array([t.month for t in timestamps])
+        is_weekend = (day_of_week >= 5).astype(int)
+        
+        rows, cols = self._density_cells(lats, lngs)
+        business_density = self._business_grid[rows, cols].astype(np.float64)
+        population_density = self._population_grid[rows, cols].astype(np.float64)
+        
+        # Lighting: night penalty plus a business density bonus
+        lighting_penalty = np.where((hour >= 18) | (hour <= 6), 30, 0)
+        lighting_bonus = np.minimum(business_density * 2, 20)
+        lighting_score = np.clip(50 - lighting_penalty + lighting_bonus, 0, 100)
+        
+        # Traffic: rush hour and late night multipliers
+        traffic_multiplier = np.where(
+            ((hour >= 7) & (hour <= 9)) | ((hour >= 17) & (hour <= 19)), 1.5,
+            np.where((hour >= 22) | (hour <= 5), 0.3, 1.0)
+        )
+        traffic_density = np.minimum(100, 50 * traffic_multiplier)
+        
+        if crime_data is not None:
+            historical_crime_score = self.get_historical_crime_scores(lats, lngs, crime_data)
+        else:
+            historical_crime_score = np.full(n, 50.0)  # Default
+        
+        columns = {
+            'hour_of_day': hour,
+            'day_of_week': day_of_week,
+            'month': month,
+            'is_weekend': is_weekend,
+            'crime_density': 100 - historical_crime_score,
+            'lighting_score': lighting_score,
+            'traffic_density': traffic_density,
+            'business_density': business_density,
+            'population_density': population_density,
+            'historical_crime_score': historical_crime_score
+        }
+        return np.column_stack([columns[name] for name in self.feature_columns]).astype(np.float32)
+    
     def train_model(self, training_data=None):
         """Train the predictive safety model"""
         if training_data is None:
@@ -137,10 +280,12 @@ class PredictiveSafetyModel:
         # Scale features
         X_train_scaled = self.scaler.fit_transform(X_train)
         X_test_scaled = self.scaler.transform(X_test)
+        self._cache_scaler_params()
         
         # Train model
         self.model = RandomForestRegressor(n_estimators=100, random_state=42)
         self.model.fit(X_train_scaled, y_train)
+        self._forest = FlattenedForest(self.model)
         
         # Evaluate
         train_score = self.model.score(X_train_scaled, y_train)
@@ -150,46 +295,41 @@ class PredictiveSafetyModel:
         print(f"Test Score: {test_score:.3f}")
         
         # Save model
-        self.save_model()
+        self.save_model(self.model_path)
         
         return self.model
     
     def generate_synthetic_training_data(self, n_samples=1000):
         """Generate synthetic training data for model training"""
-        data = []
+        # Random locations in Delhi area
+        lats = np.random.uniform(28.4, 28.8, n_samples)
+        lngs = np.random.uniform(77.0, 77.4, n_samples)
         
-        for _ in range(n_samples):
-            # Random location in Delhi area
-            lat = np.random.uniform(28.4, 28.8)
-            lng = np.random.uniform(77.0, 77.4)
-            
-            # Random timestamp
-            timestamp = datetime.now() - timedelta(days=np.random.randint(0, 365))
-            
-            # Create features
-            features = self.create_feature_vector(lat, lng, timestamp)
-            
-            # Generate synthetic safety score based on features
-            safety_score = self.calculate_synthetic_safety_score(features)
-            
-            features['safety_score'] = safety_score
-            data.append(features)
+        # Random timestamps, up to a year back
+        timestamps = (np.datetime64(datetime.now(), 'us') -
+                      np.random.randint(0, 365, n_samples).astype('timedelta64[D]'))
+        
+        # Create features for every sample at once
+        features = self.create_feature_matrix(lats, lngs, timestamps)
+        data = pd.DataFrame(features.astype(np.float64), columns=self.feature_columns)
         
-        return pd.DataFrame(data)
+        # Generate synthetic safety scores based on features
+        data['safety_score'] = self.calculate_synthetic_safety_score(data)
+        
+        return data
     
     def calculate_synthetic_safety_score(self, features):
-        """Calculate synthetic safety score based on features"""
-        score = 50  # Base score
+        """Calculate synthetic safety score based on features (scalars or
+        arrays per feature)"""
+        score = 50.0  # Base score
         
         # Time-based adjustments
-        if features['hour_of_day'] >= 22 or features['hour_of_day'] <= 5:
-            score -= 20  # Night time penalty
-        elif 6 <= features['hour_of_day'] <= 18:
-            score += 10  # Day time bonus
+        hour = np.asarray(features['hour_of_day'])
+        score += np.where((hour >= 22) | (hour <= 5), -20.0,  # Night time penalty
+                          np.where((hour >= 6) & (hour <= 18), 10.0, 0.0))  # Day time bonus
             
         # Weekend penalty
-        if features['is_weekend']:
-            score -= 5
+        score -= 5 * np.asarray(features['is_weekend'])
             
         # Lighting bonus
         score += (features['lighting_score'] - 50) * 0.3
@@ -203,32 +343,75 @@ class PredictiveSafetyModel:
         # Crime penalty
         score -= (features['crime_density'] - 50) * 0.4
         
-        return max(0, min(100, score))
+        return np.clip(score, 0, 100)
     
     def predict_safety_score(self, lat, lng, timestamp=None, crime_data=None):
         """Predict safety score for given location and time"""
-        if self.model is None:
-            self.load_model()
-        
-        if self.model is None:
-            print("Model not trained. Training now...")
-            self.train_model()
+        self._require_trained()
         
-        # Create feature vector
+        # Create feature vector as a float32 row in feature_columns order
         features = self.create_feature_vector(lat, lng, timestamp, crime_data)
-        
-        # Convert to DataFrame
-        feature_df = pd.DataFrame([features])
+        feature_row = np.array(
+            [[features[name] for name in self.feature_columns]], dtype=np.float32
+        )
         
         # Scale features
-        feature_scaled = self.scaler.transform(feature_df[self.feature_columns])
+        feature_scaled = self._scale_features(feature_row)
         
         # Predict
-        safety_score = self.model.predict(feature_scaled)[0]
+        safety_score = self._forest.predict(feature_scaled)[0]
         
         return max(0, min(100, safety_score))
     
-    def save_model(self, model_path='models/safety_model.pkl'):
+    def predict_safety_score_batch(self, lats, lngs, timestamp=None, crime_data=None):
+        """Predict safety scores for many locations with a single model call;
+        timestamp is one datetime or one per location"""
+        self._require_trained()
+        
+        if len(lats) == 0:
+            return np.empty(0)
+        
+        # One feature matrix for every location
+        features = self.create_feature_matrix(lats, lngs, timestamp, crime_data)
+        
+        # Scale and predict once
+        feature_scaled = self._scale_features(features)
+        safety_scores = self._forest.predict(feature_scaled)
+        
+        return np.clip(safety_scores, 0, 100)
+    
+    def _require_trained(self):
+        """Fail loudly instead of training inside a prediction call"""
+        if self._forest is None:
+            raise RuntimeError(
+                f"Safety model not trained: no model at {self.model_path} "
+                "(call ensure_trained() or train_model() first)"
+            )
+    
+    def ensure_trained(self, allow_training=True):
+        """Load the saved model, training and saving a new one if none exists
+        (or raising RuntimeError when allow_training is False)"""
+        if self._forest is None and not self.load_model(self.model_path):
+            if not allow_training:
+                raise RuntimeError(
+                    f"No safety model at {self.model_path} and training is disabled"
+                )
+            print("Training new safety model...")
+            self.train_model()
+        return self.model
+    
+    def _cache_scaler_params(self):
+        """Cache the fitted scaler's mean and inverse scale"""
+        # Kept in float64: scaling float32 features in float32 shifts values
+        # across split thresholds and changes predictions
+        self._scaler_mean = self.scaler.mean_.astype(np.float64)
+        self._scaler_inv_scale = 1.0 / self.scaler.scale_
+    
+    def _scale_features(self, features):
+        """StandardScaler transform inlined on a float32 feature array"""
+        return (features - self._scaler_mean) * self._scaler_inv_scale
+    
+    def save_model(self, model_path=DEFAULT_MODEL_PATH):
         """Save trained model"""
         os.makedirs(os.path.dirname(model_path), exist_ok=True)
         joblib.dump({
@@ -238,13 +421,15 @@ class PredictiveSafetyModel:
         }, model_path)
         print(f"Model saved to {model_path}")
     
-    def load_model(self, model_path='models/safety_model.pkl'):
+    def load_model(self, model_path=DEFAULT_MODEL_PATH):
         """Load trained model"""
         try:
             if os.path.exists(model_path):
                 model_data = joblib.load(model_path)
                 self.model = model_data['model']
+                self._forest = FlattenedForest(self.model)
                 self.scaler = model_data['scaler']
+                self._cache_scaler_params()
                 self.feature_columns = model_data['feature_columns']
                 print(f"Model loaded from {model_path}")
                 return True
@@ -260,8 +445,8 @@ if __name__ == "__main__":
     # Load crime data
     crime_data = safety_model.load_historical_data()
     
-    # Train model
-    safety_model.train_model()
+    # Train model (only if no saved model exists)
+    safety_model.ensure_trained()
     
     # Test prediction
     test_lat, test_lng = 28.6139, 77.2090  # Delhi coordinates
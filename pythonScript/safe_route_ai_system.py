@@ -3,45 +3,102 @@ Safe Route AI System - Main Integration Module
 Combines predictive safety scoring, dynamic geofencing, and Sakha chatbot
 """
 
-import json
-import asyncio
-from datetime import datetime, timedelta
-from typing import Dict, List, Tuple, Optional
+import itertools
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from datetime import datetime
+from enum import Enum
+from typing import Dict, List, Optional, Tuple
 import numpy as np
 
 # Import our custom modules
-from predictive_safety_model import PredictiveSafetyModel
-from dynamic_geofencing import DynamicGeofencing, AlertPhase
+from compat import DATACLASS_SLOTS
+from predictive_safety_model import DEFAULT_MODEL_PATH, PredictiveSafetyModel
+from dynamic_geofencing import DynamicGeofencing
 from enhanced_route_optimizer import EnhancedRouteOptimizer, OptimizedRoute
-from sakha_chatbot import SakhaChatbot, ChatbotState
+from sakha_chatbot import ChatbotState, SakhaChatbot
+
+# Alert level thresholds, ordered for bisect: a safety score under 20/40/60
+# or a stop longer than 10/5/2 minutes raises the level to 3/2/1
+_ALERT_SCORE_THRESHOLDS = (20, 40, 60)
+_ALERT_STOPPED_THRESHOLDS = (2, 5, 10)
+
+# Hours (22:00-05:59) that get the night travel recommendation
+_NIGHT_HOURS = frozenset(range(22, 24)) | frozenset(range(0, 6))
+
+# Route recommendations by bit (high risk, moderate, low confidence, night),
+# prebuilt for every combination of the four flags
+_ROUTE_RECOMMENDATIONS = (
+    "Route contains high-risk areas - stay alert",
+    "Overall route has moderate safety concerns",
+    "Route safety predictions have lower confidence",
+    "Night travel - ensure good lighting and company"
+)
+_RECOMMENDATION_SETS = tuple(
+    tuple(msg for bit, msg in enumerate(_ROUTE_RECOMMENDATIONS) if mask >> bit & 1)
+    for mask in range(1 << len(_ROUTE_RECOMMENDATIONS))
+)
+
+class SessionStatus(Enum):
+    ACTIVE = "active"
+    MONITORING = "monitoring"
+    COMPLETED = "completed"
+
+@dataclass(**DATACLASS_SLOTS)
+class ActiveRoute:
+    user_id: str
+    route: OptimizedRoute
+    start_time: datetime
+    status: SessionStatus = SessionStatus.ACTIVE
+
+@dataclass(**DATACLASS_SLOTS)
+class UserSession:
+    route_id: Optional[int]
+    last_update_ns: int  # time.monotonic_ns() of the last update
+    current_location: Optional[Dict] = None
+    safety_status: SessionStatus = SessionStatus.MONITORING
+    last_sakha_interaction: Optional[datetime] = None
 
 class SafeRouteAISystem:
-    def __init__(self, google_maps_api_key: str = None):
-        """Initialize the complete Safe Route AI System"""
+    def __init__(self, google_maps_api_key: str = None,
+                 model_path: Optional[str] = None, allow_training: bool = True):
+        """Initialize the complete Safe Route AI System
+        
+        Serving deployments should pass allow_training=False so a missing
+        model fails fast instead of training one at startup
+        """
         # Initialize core components
-        self.safety_model = PredictiveSafetyModel()
+        self.safety_model = PredictiveSafetyModel(model_path or DEFAULT_MODEL_PATH)
         self.geofencing = DynamicGeofencing(self.safety_model)
         self.route_optimizer = EnhancedRouteOptimizer(
             self.safety_model, google_maps_api_key
         )
         self.sakha_chatbot = SakhaChatbot()
         
-        # System state
+        # System state; writes (and the shared geofence) go through
+        # _state_lock, plain dict reads stay lock-free under the GIL
         self.active_routes = {}
         self.user_sessions = {}
         self.emergency_contacts = {}
+        self._active_count = 0  # routes in active_routes with ACTIVE status
+        self._route_ids = itertools.count(1)  # int keys for active_routes
+        self._state_lock = threading.RLock()
+        
+        # Wall/monotonic clock pair for turning session timestamps into datetimes
+        self._wall_epoch_ns = time.time_ns()
+        self._mono_epoch_ns = time.monotonic_ns()
         
         # Load and train the safety model
-        self._initialize_safety_model()
+        self._initialize_safety_model(allow_training)
     
-    def _initialize_safety_model(self):
+    def _initialize_safety_model(self, allow_training: bool = True):
         """Initialize and train the safety model"""
         print("Initializing safety model...")
         
-        # Try to load existing model
-        if not self.safety_model.load_model():
-            print("Training new safety model...")
-            self.safety_model.train_model()
+        # Use the saved model, training one only if none exists (and allowed)
+        self.safety_model.ensure_trained(allow_training)
         
         print("Safety model ready!")
     
@@ -51,10 +108,16 @@ class SafeRouteAISystem:
                        end_lat: float, 
                        end_lng: float,
                        user_id: str,
-                       departure_time: Optional[datetime] = None) -> Dict:
-        """Plan an optimized safe route for a user"""
+                       departure_time: Optional[datetime] = None,
+                       verbose: bool = True) -> Dict:
+        """Plan an optimized safe route for a user
+        
+        With verbose=False the waypoints come back as parallel lists under
+        "waypoint_arrays" instead of one dict per point under "waypoints"
+        """
+        now = datetime.now()
         if departure_time is None:
-            departure_time = datetime.now()
+            departure_time = now
         
         print(f"Planning safe route for user {user_id}...")
         
@@ -66,44 +129,64 @@ class SafeRouteAISystem:
         if not optimized_route:
             return {"error": "Unable to plan route"}
         
-        # Set up geofencing for the route
-        route_coordinates = [(point.lat, point.lng) for point in optimized_route.points]
-        self.geofencing.set_planned_route(route_coordinates)
-        
-        # Store route information
-        route_id = f"route_{user_id}_{int(datetime.now().timestamp())}"
-        self.active_routes[route_id] = {
-            "user_id": user_id,
-            "route": optimized_route,
-            "start_time": departure_time,
-            "status": "active"
-        }
-        
-        # Create user session
-        self.user_sessions[user_id] = {
-            "route_id": route_id,
-            "current_location": None,
-            "safety_status": "monitoring",
-            "last_update": datetime.now()
-        }
+        # (N, 2) lat/lng array; geofencing uses it without copying
+        route_coordinates = np.column_stack((optimized_route.lats, optimized_route.lngs))
+        
+        with self._state_lock:
+            route_id = next(self._route_ids)
+            
+            # Set up geofencing for the route
+            self.geofencing.set_planned_route(route_coordinates)
+            
+            # Store route information
+            self.active_routes[route_id] = ActiveRoute(
+                user_id=user_id,
+                route=optimized_route,
+                start_time=departure_time
+            )
+            self._active_count += 1
+            
+            # Create user session
+            self.user_sessions[user_id] = UserSession(
+                route_id=route_id,
+                last_update_ns=time.monotonic_ns()
+            )
         
         # Prepare route response
         route_response = {
-            "route_id": route_id,
+            "route_id": self._route_label(user_id, route_id),
             "total_safety_score": optimized_route.total_safety_score,
             "total_travel_time": optimized_route.total_travel_time,
-            "route_confidence": optimized_route.route_confidence,
-            "waypoints": [
+            "route_confidence": optimized_route.route_confidence
+        }
+        
+        lats = optimized_route.lats.tolist()
+        lngs = optimized_route.lngs.tolist()
+        safety_scores = optimized_route.safety_scores.tolist()
+        travel_times = optimized_route.travel_times.tolist()
+        if verbose:
+            route_response["waypoints"] = [
                 {
-                    "lat": point.lat,
-                    "lng": point.lng,
-                    "safety_score": point.safety_score,
-                    "estimated_time": point.estimated_travel_time
+                    "lat": lat,
+                    "lng": lng,
+                    "safety_score": safety_score,
+                    "estimated_time": travel_time
                 }
-                for point in optimized_route.points
-            ],
-            "safety_recommendations": self._generate_route_recommendations(optimized_route)
-        }
+                for lat, lng, safety_score, travel_time in zip(
+                    lats, lngs, safety_scores, travel_times
+                )
+            ]
+        else:
+            route_response["waypoint_arrays"] = {
+                "lat": lats,
+                "lng": lngs,
+                "safety_score": safety_scores,
+                "estimated_time": travel_times
+            }
+        
+        route_response["safety_recommendations"] = self._generate_route_recommendations(
+            optimized_route, now.hour
+        )
         
         print(f"Route planned successfully. Safety Score: {optimized_route.total_safety_score:.2f}")
         return route_response
@@ -111,29 +194,31 @@ class SafeRouteAISystem:
     def update_user_location(self, user_id: str, lat: float, lng: float, 
                            speed: float = 0.0, accuracy: float = 10.0) -> Dict:
         """Update user location and check for safety anomalies"""
-        if user_id not in self.user_sessions:
-            return {"error": "User session not found"}
-        
-        # Update geofencing system
-        anomaly_detected = self.geofencing.update_user_location(lat, lng, speed, accuracy)
-        
-        # Update user session
-        self.user_sessions[user_id].update({
-            "current_location": {"lat": lat, "lng": lng},
-            "last_update": datetime.now()
-        })
-        
-        # Get current safety status
-        safety_status = self.geofencing.get_current_safety_status()
+        with self._state_lock:
+            # Look the session up under the lock, so an ended session never
+            # reaches the shared geofence
+            user_session = self.user_sessions.get(user_id)
+            if user_session is None:
+                return {"error": "User session not found"}
+            
+            # Update geofencing system
+            anomaly_detected = self.geofencing.update_user_location(lat, lng, speed, accuracy)
+            
+            # Update user session
+            user_session.current_location = {"lat": lat, "lng": lng}
+            user_session.last_update_ns = time.monotonic_ns()
+            
+            # Get current safety status
+            safety_status = self.geofencing.get_current_safety_status()
         
         # Handle anomalies
         response = {"location_updated": True, "anomaly_detected": anomaly_detected}
         
         if anomaly_detected:
             # Get current route
-            route_id = self.user_sessions[user_id]["route_id"]
+            route_id = user_session.route_id
             if route_id in self.active_routes:
-                route = self.active_routes[route_id]["route"]
+                route = self.active_routes[route_id].route
                 
                 # Get real-time safety updates
                 safety_updates = self.route_optimizer.get_real_time_safety_updates(
@@ -142,9 +227,10 @@ class SafeRouteAISystem:
                 
                 # Activate Sakha chatbot based on alert level
                 alert_level = self._determine_alert_level(safety_status, safety_updates)
-                sakha_response = self.sakha_chatbot.activate_proactive_intervention(
-                    alert_level, {"lat": lat, "lng": lng}, safety_updates["current_safety_score"]
-                )
+                with self._state_lock:
+                    sakha_response = self.sakha_chatbot.activate_proactive_intervention(
+                        alert_level, {"lat": lat, "lng": lng}, safety_updates["current_safety_score"]
+                    )
                 
                 response.update({
                     "safety_updates": safety_updates,
@@ -156,70 +242,76 @@ class SafeRouteAISystem:
     
     def _determine_alert_level(self, safety_status: Dict, safety_updates: Dict) -> int:
         """Determine alert level based on safety status and updates"""
-        current_score = safety_updates.get("current_safety_score", 50)
-        stopped_duration = safety_status.get("stopped_duration", 0)
-        
-        # Emergency level (3)
-        if current_score < 20 or stopped_duration > 10:
-            return 3
-        
-        # Escalation level (2)
-        elif current_score < 40 or stopped_duration > 5:
-            return 2
-        
-        # Soft check level (1)
-        elif current_score < 60 or stopped_duration > 2:
-            return 1
-        
-        # Normal level (0)
-        else:
-            return 0
+        # Both keys are always set by get_real_time_safety_updates and
+        # get_current_safety_status
+        current_score = safety_updates["current_safety_score"]
+        stopped_duration = safety_status["stopped_duration"]
+        
+        # The higher of the score-based and stop-based levels wins
+        score_level = 3 - bisect_right(_ALERT_SCORE_THRESHOLDS, current_score)
+        stopped_level = bisect_left(_ALERT_STOPPED_THRESHOLDS, stopped_duration)
+        return max(score_level, stopped_level)
     
-    def _generate_route_recommendations(self, route: OptimizedRoute) -> List[str]:
+    def _generate_route_recommendations(self, route: OptimizedRoute, current_hour: int) -> Tuple[str, ...]:
         """Generate safety recommendations for the route"""
-        recommendations = []
-        
-        # Analyze route safety scores
-        safety_scores = [point.safety_score for point in route.points]
-        avg_safety = np.mean(safety_scores)
-        min_safety = np.min(safety_scores)
-        
-        if min_safety < 30:
-            recommendations.append("Route contains high-risk areas - stay alert")
-        
-        if avg_safety < 50:
-            recommendations.append("Overall route has moderate safety concerns")
-        
-        if route.route_confidence < 0.7:
-            recommendations.append("Route safety predictions have lower confidence")
-        
-        # Time-based recommendations
-        current_hour = datetime.now().hour
-        if 22 <= current_hour or current_hour <= 5:
-            recommendations.append("Night travel - ensure good lighting and company")
-        
-        return recommendations
+        # Analyze route safety scores in one pass; routes are a handful of
+        # steps, where a plain loop beats two NumPy reductions
+        total_safety = 0.0
+        min_safety = float('inf')
+        scores = route.safety_scores.tolist()
+        for score in scores:
+            total_safety += score
+            if score < min_safety:
+                min_safety = score
+        avg_safety = total_safety / len(scores) if scores else float('nan')
+        
+        mask = ((min_safety < 30)
+                | (avg_safety < 50) << 1
+                | (route.route_confidence < 0.7) << 2
+                | (current_hour in _NIGHT_HOURS) << 3)  # time-based
+        
+        return _RECOMMENDATION_SETS[mask]
+    
+    def ensure_user_session(self, user_id: str) -> UserSession:
+        """Get the user's session, creating a route-less one if needed"""
+        session = self.user_sessions.get(user_id)
+        if session is not None:
+            return session
+        
+        with self._state_lock:
+            return self.user_sessions.setdefault(user_id, UserSession(
+                route_id=None,
+                last_update_ns=time.monotonic_ns()
+            ))
+    
+    def activate_sakha(self):
+        """Wake the shared Sakha chatbot if it is idle"""
+        with self._state_lock:
+            if self.sakha_chatbot.state is ChatbotState.IDLE:
+                self.sakha_chatbot.state = ChatbotState.ACTIVE
     
     def process_sakha_message(self, user_id: str, message: str) -> Dict:
         """Process message to Sakha chatbot"""
-        if user_id not in self.user_sessions:
-            return {"error": "User session not found"}
-        
-        # Process message through Sakha
-        sakha_response = self.sakha_chatbot.process_user_message(message, user_id)
-        
-        # Update user session
-        self.user_sessions[user_id]["last_sakha_interaction"] = datetime.now()
+        with self._state_lock:
+            user_session = self.user_sessions.get(user_id)
+            if user_session is None:
+                return {"error": "User session not found"}
+            
+            # Process message through Sakha
+            sakha_response = self.sakha_chatbot.process_user_message(message, user_id)
+            
+            # Update user session
+            user_session.last_sakha_interaction = datetime.now()
         
         return sakha_response
     
     def get_user_safety_status(self, user_id: str) -> Dict:
         """Get comprehensive safety status for a user"""
-        if user_id not in self.user_sessions:
+        user_session = self.user_sessions.get(user_id)
+        if user_session is None:
             return {"error": "User session not found"}
         
-        user_session = self.user_sessions[user_id]
-        route_id = user_session["route_id"]
+        route_id = user_session.route_id
         
         if route_id not in self.active_routes:
             return {"error": "Active route not found"}
@@ -227,60 +319,74 @@ class SafeRouteAISystem:
         # Get current safety status from geofencing
         safety_status = self.geofencing.get_current_safety_status()
         
-        # Get Sakha conversation summary
-        sakha_summary = self.sakha_chatbot.get_conversation_summary()
+        # Snapshot Sakha under the lock; its history deque must not change
+        # while the summary iterates it
+        with self._state_lock:
+            sakha_summary = self.sakha_chatbot.get_conversation_summary()
+            sakha_state = self.sakha_chatbot.state.value
+            sakha_alert_level = self.sakha_chatbot.current_alert_level
         
         # Get route information
         route_info = self.active_routes[route_id]
         
         return {
             "user_id": user_id,
-            "current_location": user_session["current_location"],
+            "current_location": user_session.current_location,
             "safety_status": safety_status,
             "route_info": {
-                "route_id": route_id,
-                "total_safety_score": route_info["route"].total_safety_score,
-                "route_confidence": route_info["route"].route_confidence
+                "route_id": self._route_label(user_id, route_id),
+                "total_safety_score": route_info.route.total_safety_score,
+                "route_confidence": route_info.route.route_confidence
             },
             "sakha_status": {
-                "state": self.sakha_chatbot.state.value,
-                "alert_level": self.sakha_chatbot.current_alert_level,
+                "state": sakha_state,
+                "alert_level": sakha_alert_level,
                 "conversation_summary": sakha_summary
             },
-            "last_update": user_session["last_update"].isoformat()
+            "last_update": self._wall_time(user_session.last_update_ns).isoformat()
         }
     
+    def _route_label(self, user_id: str, route_id: int) -> str:
+        """External string form of an internal route id"""
+        return f"route_{user_id}_{route_id}"
+    
+    def _wall_time(self, monotonic_ns: int) -> datetime:
+        """Convert a time.monotonic_ns() reading to a local datetime"""
+        wall_ns = self._wall_epoch_ns + (monotonic_ns - self._mono_epoch_ns)
+        return datetime.fromtimestamp(wall_ns / 1e9)
+    
     def set_emergency_contacts(self, user_id: str, contacts: List[Dict]):
         """Set emergency contacts for a user"""
-        self.emergency_contacts[user_id] = contacts
-        self.sakha_chatbot.set_emergency_contacts(contacts)
+        with self._state_lock:
+            self.emergency_contacts[user_id] = contacts
+            self.sakha_chatbot.set_emergency_contacts(contacts)
         
         return {"status": "emergency_contacts_set", "count": len(contacts)}
     
     def end_user_session(self, user_id: str) -> Dict:
         """End user session and cleanup"""
-        if user_id not in self.user_sessions:
-            return {"error": "User session not found"}
-        
-        # Get route ID
-        route_id = self.user_sessions[user_id]["route_id"]
-        
-        # Mark route as completed
-        if route_id in self.active_routes:
-            self.active_routes[route_id]["status"] = "completed"
-        
-        # Reset Sakha chatbot
-        self.sakha_chatbot.reset_state()
-        
-        # Remove user session
-        del self.user_sessions[user_id]
+        with self._state_lock:
+            # Remove user session
+            user_session = self.user_sessions.pop(user_id, None)
+            if user_session is None:
+                return {"error": "User session not found"}
+            
+            # Mark route as completed
+            route_id = user_session.route_id
+            active_route = self.active_routes.get(route_id)
+            if active_route is not None and active_route.status is SessionStatus.ACTIVE:
+                active_route.status = SessionStatus.COMPLETED
+                self._active_count -= 1
+            
+            # Reset Sakha chatbot
+            self.sakha_chatbot.reset_state()
         
         return {"status": "session_ended", "user_id": user_id}
     
     def get_system_status(self) -> Dict:
         """Get overall system status"""
         return {
-            "active_routes": len([r for r in self.active_routes.values() if r["status"] == "active"]),
+            "active_routes": self._active_count,
             "active_users": len(self.user_sessions),
             "safety_model_loaded": self.safety_model.model is not None,
             "sakha_state": self.sakha_chatbot.state.value,
@@ -1,56 +1,170 @@
-import json
+import logging
 import random
+import re
+from collections import deque
+from itertools import islice
 from datetime import datetime
 from typing import Dict, List, Optional
 from enum import Enum
 
+logger = logging.getLogger(__name__)
+
 class ChatbotState(Enum):
     IDLE = "idle"
     ACTIVE = "active"
     EMERGENCY = "emergency"
     SUPPORT = "support"
 
+# Intent keywords in priority order, matched as substrings of the message
+_INTENT_KEYWORDS = (
+    ("emergency", ("help", "emergency", "danger", "scared", "unsafe", "threat", "dangerous", "attack", "violence", "stalking", "harassment")),
+    ("safety_confirmation", ("okay", "fine", "safe", "good", "alright", "yes", "sure", "ok", "great", "wonderful")),
+    ("legal_advice", ("rights", "legal", "police", "law", "report", "court", "lawyer", "justice", "complaint", "file")),
+    ("emotional_support", ("scared", "worried", "anxious", "fear", "nervous", "sad", "depressed", "lonely", "confused", "overwhelmed")),
+    ("greeting", ("hello", "hi", "hey", "good morning", "good afternoon", "good evening", "how are you"))
+)
+
+# Sentiment weight per word; words are whole \w+ tokens ("safe" does not
+# count inside "unsafe")
+_WORD_RE = re.compile(r"\w+")
+_SENTIMENT_SCORES = {
+    "good": 1, "fine": 1, "safe": 1, "okay": 1, "better": 1, "calm": 1,
+    "bad": -1, "scared": -1, "worried": -1, "unsafe": -1, "danger": -1, "fear": -1
+}
+
+# Static response parts, built once and shared by every response (read-only;
+# handlers return shallow copies of the dicts)
+_GREETING_RESPONSES = (
+    "Hello! I'm Sakha, your safety companion. I'm here to help you stay safe.",
+    "Hi there! I'm monitoring your safety. How are you feeling today?",
+    "Hey! I'm your safety assistant. I'm here to support you.",
+    "Hello! I want to make sure you're safe. How can I help you today?",
+    "Hi! I'm Sakha, and I'm here to help you feel secure and protected."
+)
+
+_GENERAL_RESPONSES = (
+    "I'm here to help you stay safe. What do you need?",
+    "Hello! I'm Sakha, your safety companion. How can I help you today?",
+    "Hi there! I'm monitoring your safety. What's on your mind?",
+    "Hey! I'm here to support you. What can I help you with?",
+    "Hello! I want to make sure you're safe. How are you feeling?",
+    "Hi! I'm your safety assistant. What do you need help with?"
+)
+
+_AVAILABLE_HELP = (
+    "Safety tips",
+    "Legal guidance",
+    "Emotional support",
+    "Emergency assistance"
+)
+
+_SAFETY_CONFIRMATION_RESPONSE = {
+    "message": "I'm glad you're safe! I'll continue monitoring your journey.",
+    "monitoring_continues": True,
+    "alert_level_reduced": True
+}
+
+_ADDITIONAL_LEGAL_RESOURCES = (
+    "Women's helpline: 1091",
+    "Police emergency: 100",
+    "Legal aid services available"
+)
+
+_EMOTIONAL_SUPPORT_RESPONSE = {
+    "support_techniques": (
+        "Deep breathing exercises",
+        "Stay in well-lit areas",
+        "Keep emergency contacts ready",
+        "Trust your instincts"
+    ),
+    "sakha_presence": "I'm here with you. You're not alone."
+}
+
+_LEGAL_GUIDANCE = {
+    "immediate_rights": (
+        "Right to safety and security",
+        "Right to report crimes",
+        "Right to legal assistance",
+        "Right to emergency services"
+    ),
+    "emergency_numbers": {
+        "Police": "100",
+        "Women's Helpline": "1091",
+        "Domestic Violence": "181",
+        "Legal Aid": "1800-345-6789"
+    },
+    "legal_steps": (
+        "Document the incident",
+        "Report to authorities",
+        "Seek legal counsel",
+        "Preserve evidence"
+    )
+}
+
+_EMOTIONAL_SUPPORT_GUIDANCE = {
+    "support_techniques": (
+        "Deep breathing: Inhale for 4, hold for 4, exhale for 4",
+        "Grounding: Name 5 things you can see, 4 you can touch, 3 you can hear",
+        "Positive affirmations: 'I am safe, I am strong, I will get through this'"
+    ),
+    "immediate_actions": (
+        "Find a safe, well-lit area",
+        "Call someone you trust",
+        "Stay alert to your surroundings",
+        "Trust your instincts"
+    )
+}
+
 class SakhaChatbot:
+    # Fixed attribute set: no per-instance __dict__, direct slot access
+    __slots__ = (
+        "_state", "_state_value", "conversation_history", "user_context",
+        "emergency_contacts", "current_alert_level", "response_templates",
+        "_emergency_templates", "emergency_protocols", "_intent_handlers"
+    )
+    
     def __init__(self):
         self.state = ChatbotState.IDLE
-        self.conversation_history = []
+        self.conversation_history = deque(maxlen=100)  # last 100 interactions
         self.user_context = {}
         self.emergency_contacts = []
         self.current_alert_level = 0
         
-        # Pre-defined response templates
+        # Pre-defined response templates (tuples: built once, never mutated)
         self.response_templates = {
-            "greeting": [
+            "greeting": (
                 "Hi! I'm Sakha, your safety companion. I'm here to help you stay safe.",
                 "Hello! I'm monitoring your safety. How are you feeling right now?",
                 "Hey there! I noticed you might need some support. I'm here for you."
-            ],
-            "safety_check": [
+            ),
+            "safety_check": (
                 "Are you feeling safe right now? Please let me know if you need any help.",
                 "I want to make sure you're okay. Is everything alright?",
                 "Your safety is my priority. How can I help you feel more secure?"
-            ],
-            "emergency_support": [
+            ),
+            "emergency_support": (
                 "I'm here with you. You're not alone. What's happening right now?",
                 "Stay calm, I'm getting help. Can you tell me what you need?",
                 "I'm activating emergency protocols. Help is on the way. Stay safe."
-            ],
-            "legal_advice": [
+            ),
+            "legal_advice": (
                 "I can help you understand your rights. What legal information do you need?",
                 "Here are some important legal resources for your situation...",
                 "Remember, you have rights. Let me share some legal guidance with you."
-            ],
-            "emotional_support": [
+            ),
+            "emotional_support": (
                 "I understand this is difficult. You're being very brave.",
                 "It's okay to feel scared. I'm here to support you.",
                 "You're not alone in this. I'm with you every step of the way."
-            ],
-            "practical_tips": [
+            ),
+            "practical_tips": (
                 "Here are some immediate safety tips for your current situation...",
                 "Try these techniques to stay safe and alert...",
                 "Here's what you can do right now to improve your safety..."
-            ]
+            )
         }
+        # Picked on every escalation/emergency turn
+        self._emergency_templates = self.response_templates["emergency_support"]
         
         # Emergency protocols
         self.emergency_protocols = {
@@ -59,27 +173,47 @@ class SakhaChatbot:
             "provide_legal_guidance": self._provide_legal_guidance,
             "offer_emotional_support": self._offer_emotional_support
         }
+        
+        # Response handler per message intent ("general" is the fallback)
+        self._intent_handlers = {
+            "emergency": self._handle_emergency_response,
+            "safety_confirmation": self._handle_safety_confirmation_response,
+            "legal_advice": self._handle_legal_advice_response,
+            "emotional_support": self._handle_emotional_support_response,
+            "greeting": self._handle_greeting_response
+        }
+    
+    @property
+    def state(self) -> ChatbotState:
+        return self._state
+    
+    @state.setter
+    def state(self, state: ChatbotState):
+        # Keep the state's string value alongside it for interaction logging
+        self._state = state
+        self._state_value = state.value
     
     def activate_proactive_intervention(self, alert_level: int, user_location: Dict, 
                                       safety_score: float) -> Dict:
         """Activate proactive intervention based on alert level"""
         self.current_alert_level = alert_level
+        timestamp = datetime.now()  # shared by every log entry below
         self.user_context.update({
             "location": user_location,
             "safety_score": safety_score,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": timestamp
         })
         
         if alert_level == 1:  # Soft check
-            return self._handle_soft_check_intervention()
+            return self._handle_soft_check_intervention(timestamp)
         elif alert_level == 2:  # Escalation
-            return self._handle_escalation_intervention()
+            return self._handle_escalation_intervention(timestamp)
         elif alert_level == 3:  # Emergency
-            return self._handle_emergency_intervention()
+            return self._handle_emergency_intervention(timestamp)
         
         return {"status": "no_intervention_needed"}
     
-    def _handle_soft_check_intervention(self) -> Dict:
+    def _handle_soft_check_intervention(self, timestamp: Optional[datetime] = None) -> Dict:
         """Handle soft check intervention"""
         self.state = ChatbotState.ACTIVE
         
@@ -96,16 +230,16 @@ class SakhaChatbot:
             "emergency_contacts_prepared": False
         }
         
-        self._log_interaction("soft_check_initiated", response)
+        self._log_interaction("soft_check_initiated", response, timestamp)
         return response
     
-    def _handle_escalation_intervention(self) -> Dict:
+    def _handle_escalation_intervention(self, timestamp: Optional[datetime] = None) -> Dict:
         """Handle escalation intervention"""
         self.state = ChatbotState.ACTIVE
         
         response = {
             "intervention_type": "escalation",
-            "message": random.choice(self.response_templates["emergency_support"]),
+            "message": random.choice(self._emergency_templates),
             "sakha_ready": True,
             "emergency_contacts_prepared": True,
             "available_support": [
@@ -117,19 +251,21 @@ class SakhaChatbot:
             "conversation_started": True
         }
         
-        self._log_interaction("escalation_initiated", response)
+        self._log_interaction("escalation_initiated", response, timestamp)
         return response
     
-    def _handle_emergency_intervention(self) -> Dict:
+    def _handle_emergency_intervention(self, timestamp: Optional[datetime] = None) -> Dict:
         """Handle emergency intervention"""
         self.state = ChatbotState.EMERGENCY
+        if timestamp is None:
+            timestamp = datetime.now()
         
         # Activate emergency protocols
-        self._activate_emergency_protocols()
+        self._activate_emergency_protocols(timestamp)
         
         response = {
             "intervention_type": "emergency",
-            "message": random.choice(self.response_templates["emergency_support"]),
+            "message": random.choice(self._emergency_templates),
             "emergency_services_contacted": True,
             "emergency_contacts_notified": True,
             "sakha_ready": True,
@@ -141,17 +277,18 @@ class SakhaChatbot:
             ]
         }
         
-        self._log_interaction("emergency_initiated", response)
+        self._log_interaction("emergency_initiated", response, timestamp)
         return response
     
     def process_user_message(self, message: str, user_id: str = None) -> Dict:
         """Process user message and provide contextual response"""
-        if self.state == ChatbotState.IDLE:
+        if self._state is ChatbotState.IDLE:
             return {"message": "Sakha is not currently active."}
         
         # Analyze message sentiment and intent
-        intent = self._analyze_message_intent(message)
-        sentiment = self._analyze_sentiment(message)
+        message_lower = message.lower()
+        intent = self._analyze_message_intent(message_lower)
+        sentiment = self._analyze_sentiment(message_lower)
         
         # Generate contextual response
         response = self._generate_contextual_response(message, intent, sentiment)
@@ -166,67 +303,35 @@ class SakhaChatbot:
         
         return response
     
-    def _analyze_message_intent(self, message: str) -> str:
-        """Analyze user message intent"""
-        message_lower = message.lower()
-        
-        # Emergency keywords
-        emergency_keywords = ["help", "emergency", "danger", "scared", "unsafe", "threat", "dangerous", "attack", "violence", "stalking", "harassment"]
-        if any(keyword in message_lower for keyword in emergency_keywords):
-            return "emergency"
-        
-        # Safety check keywords
-        safety_keywords = ["okay", "fine", "safe", "good", "alright", "yes", "sure", "ok", "great", "wonderful"]
-        if any(keyword in message_lower for keyword in safety_keywords):
-            return "safety_confirmation"
-        
-        # Legal advice keywords
-        legal_keywords = ["rights", "legal", "police", "law", "report", "court", "lawyer", "justice", "complaint", "file"]
-        if any(keyword in message_lower for keyword in legal_keywords):
-            return "legal_advice"
-        
-        # Emotional support keywords
-        emotional_keywords = ["scared", "worried", "anxious", "fear", "nervous", "sad", "depressed", "lonely", "confused", "overwhelmed"]
-        if any(keyword in message_lower for keyword in emotional_keywords):
-            return "emotional_support"
-        
-        # Greeting keywords
-        greeting_keywords = ["hello", "hi", "hey", "good morning", "good afternoon", "good evening", "how are you"]
-        if any(keyword in message_lower for keyword in greeting_keywords):
-            return "greeting"
+    def _analyze_message_intent(self, message_lower: str) -> str:
+        """Analyze user message intent (message already lowercased)"""
+        # First intent (in priority order) with a keyword in the message wins
+        for intent, keywords in _INTENT_KEYWORDS:
+            for keyword in keywords:
+                if keyword in message_lower:
+                    return intent
         
         return "general"
     
-    def _analyze_sentiment(self, message: str) -> str:
-        """Analyze message sentiment (simplified)"""
-        positive_words = ["good", "fine", "safe", "okay", "better", "calm"]
-        negative_words = ["bad", "scared", "worried", "unsafe", "danger", "fear"]
+    def _analyze_sentiment(self, message_lower: str) -> str:
+        """Analyze message sentiment (simplified; message already lowercased)"""
+        # One pass over the words: positive minus negative matches
+        score = 0
+        for word in _WORD_RE.findall(message_lower):
+            if word in _SENTIMENT_SCORES:
+                score += _SENTIMENT_SCORES[word]
         
-        message_lower = message.lower()
-        positive_count = sum(1 for word in positive_words if word in message_lower)
-        negative_count = sum(1 for word in negative_words if word in message_lower)
-        
-        if negative_count > positive_count:
+        if score < 0:
             return "negative"
-        elif positive_count > negative_count:
+        elif score > 0:
             return "positive"
         else:
             return "neutral"
     
     def _generate_contextual_response(self, message: str, intent: str, sentiment: str) -> Dict:
         """Generate contextual response based on intent and sentiment"""
-        if intent == "emergency":
-            return self._handle_emergency_response()
-        elif intent == "safety_confirmation":
-            return self._handle_safety_confirmation_response()
-        elif intent == "legal_advice":
-            return self._handle_legal_advice_response()
-        elif intent == "emotional_support":
-            return self._handle_emotional_support_response()
-        elif intent == "greeting":
-            return self._handle_greeting_response()
-        else:
-            return self._handle_general_response()
+        handler = self._intent_handlers.get(intent, self._handle_general_response)
+        return handler()
     
     def _handle_emergency_response(self) -> Dict:
         """Handle emergency response"""
@@ -234,7 +339,7 @@ class SakhaChatbot:
         self._activate_emergency_protocols()
         
         return {
-            "message": random.choice(self.response_templates["emergency_support"]),
+            "message": random.choice(self._emergency_templates),
             "immediate_actions": [
                 "Emergency services contacted",
                 "Your location shared with responders",
@@ -246,11 +351,7 @@ class SakhaChatbot:
     
     def _handle_safety_confirmation_response(self) -> Dict:
         """Handle safety confirmation response"""
-        return {
-            "message": "I'm glad you're safe! I'll continue monitoring your journey.",
-            "monitoring_continues": True,
-            "alert_level_reduced": True
-        }
+        return dict(_SAFETY_CONFIRMATION_RESPONSE)
     
     def _handle_legal_advice_response(self) -> Dict:
         """Handle legal advice response"""
@@ -259,155 +360,94 @@ class SakhaChatbot:
         return {
             "message": random.choice(self.response_templates["legal_advice"]),
             "legal_information": legal_info,
-            "additional_resources": [
-                "Women's helpline: 1091",
-                "Police emergency: 100",
-                "Legal aid services available"
-            ]
+            "additional_resources": _ADDITIONAL_LEGAL_RESOURCES
         }
     
     def _handle_emotional_support_response(self) -> Dict:
         """Handle emotional support response"""
         return {
             "message": random.choice(self.response_templates["emotional_support"]),
-            "support_techniques": [
-                "Deep breathing exercises",
-                "Stay in well-lit areas",
-                "Keep emergency contacts ready",
-                "Trust your instincts"
-            ],
-            "sakha_presence": "I'm here with you. You're not alone."
+            **_EMOTIONAL_SUPPORT_RESPONSE
         }
     
     def _handle_greeting_response(self) -> Dict:
         """Handle greeting response"""
-        greeting_responses = [
-            "Hello! I'm Sakha, your safety companion. I'm here to help you stay safe.",
-            "Hi there! I'm monitoring your safety. How are you feeling today?",
-            "Hey! I'm your safety assistant. I'm here to support you.",
-            "Hello! I want to make sure you're safe. How can I help you today?",
-            "Hi! I'm Sakha, and I'm here to help you feel secure and protected."
-        ]
-        
         return {
-            "message": random.choice(greeting_responses),
-            "available_help": [
-                "Safety tips",
-                "Legal guidance", 
-                "Emotional support",
-                "Emergency assistance"
-            ]
+            "message": random.choice(_GREETING_RESPONSES),
+            "available_help": _AVAILABLE_HELP
         }
     
     def _handle_general_response(self) -> Dict:
         """Handle general response"""
         # Use varied greeting responses
-        greeting_responses = [
-            "I'm here to help you stay safe. What do you need?",
-            "Hello! I'm Sakha, your safety companion. How can I help you today?",
-            "Hi there! I'm monitoring your safety. What's on your mind?",
-            "Hey! I'm here to support you. What can I help you with?",
-            "Hello! I want to make sure you're safe. How are you feeling?",
-            "Hi! I'm your safety assistant. What do you need help with?"
-        ]
-        
         return {
-            "message": random.choice(greeting_responses),
-            "available_help": [
-                "Safety tips",
-                "Legal guidance", 
-                "Emotional support",
-                "Emergency assistance"
-            ]
+            "message": random.choice(_GENERAL_RESPONSES),
+            "available_help": _AVAILABLE_HELP
         }
     
-    def _activate_emergency_protocols(self):
+    def _activate_emergency_protocols(self, timestamp: Optional[datetime] = None):
         """Activate emergency protocols"""
-        self._contact_emergency_services()
-        self._notify_emergency_contacts()
+        if timestamp is None:
+            timestamp = datetime.now()
+        self._contact_emergency_services(timestamp)
+        self._notify_emergency_contacts(timestamp)
     
-    def _contact_emergency_services(self):
+    def _contact_emergency_services(self, timestamp: Optional[datetime] = None):
         """Contact emergency services"""
+        if timestamp is None:
+            timestamp = datetime.now()
         # In real implementation, this would make actual API calls
-        print("EMERGENCY SERVICES CONTACTED")
+        logger.warning("EMERGENCY SERVICES CONTACTED")
         self._log_interaction("emergency_services_contacted", {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": timestamp,
             "location": self.user_context.get("location", {}),
             "safety_score": self.user_context.get("safety_score", 0)
-        })
+        }, timestamp)
     
-    def _notify_emergency_contacts(self):
+    def _notify_emergency_contacts(self, timestamp: Optional[datetime] = None):
         """Notify emergency contacts"""
+        if timestamp is None:
+            timestamp = datetime.now()
         # In real implementation, this would send actual notifications
-        print("EMERGENCY CONTACTS NOTIFIED")
+        logger.warning("EMERGENCY CONTACTS NOTIFIED")
         self._log_interaction("emergency_contacts_notified", {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": timestamp,
             "contacts": self.emergency_contacts
-        })
+        }, timestamp)
     
     def _provide_legal_guidance(self) -> Dict:
         """Provide legal guidance"""
-        return {
-            "immediate_rights": [
-                "Right to safety and security",
-                "Right to report crimes",
-                "Right to legal assistance",
-                "Right to emergency services"
-            ],
-            "emergency_numbers": {
-                "Police": "100",
-                "Women's Helpline": "1091",
-                "Domestic Violence": "181",
-                "Legal Aid": "1800-345-6789"
-            },
-            "legal_steps": [
-                "Document the incident",
-                "Report to authorities",
-                "Seek legal counsel",
-                "Preserve evidence"
-            ]
-        }
+        return dict(_LEGAL_GUIDANCE)
     
     def _offer_emotional_support(self) -> Dict:
         """Offer emotional support"""
-        return {
-            "support_techniques": [
-                "Deep breathing: Inhale for 4, hold for 4, exhale for 4",
-                "Grounding: Name 5 things you can see, 4 you can touch, 3 you can hear",
-                "Positive affirmations: 'I am safe, I am strong, I will get through this'"
-            ],
-            "immediate_actions": [
-                "Find a safe, well-lit area",
-                "Call someone you trust",
-                "Stay alert to your surroundings",
-                "Trust your instincts"
-            ]
-        }
+        return dict(_EMOTIONAL_SUPPORT_GUIDANCE)
     
-    def _log_interaction(self, interaction_type: str, data: Dict):
-        """Log chatbot interaction"""
+    def _log_interaction(self, interaction_type: str, data: Dict, timestamp: Optional[datetime] = None):
+        """Log chatbot interaction (timestamp defaults to now)"""
         interaction = {
             "type": interaction_type,
-            "timestamp": datetime.now().isoformat(),
-            "state": self.state.value,
+            "timestamp": timestamp or datetime.now(),
+            "state": self._state_value,
             "alert_level": self.current_alert_level,
             "data": data
         }
         
+        # The deque drops the oldest interaction once it holds 100
         self.conversation_history.append(interaction)
-        
-        # Keep only last 100 interactions
-        if len(self.conversation_history) > 100:
-            self.conversation_history = self.conversation_history[-100:]
     
     def get_conversation_summary(self) -> Dict:
-        """Get conversation summary for emergency responders"""
+        """Get conversation summary for emergency responders.
+        Timestamps in user_context and the interactions stay datetime objects;
+        serialize with orjson (as the API's JSON provider does), not stdlib json."""
         return {
             "total_interactions": len(self.conversation_history),
-            "current_state": self.state.value,
+            "current_state": self._state_value,
             "alert_level": self.current_alert_level,
             "user_context": self.user_context,
-            "recent_interactions": self.conversation_history[-10:] if self.conversation_history else []
+            "recent_interactions": list(islice(
+                self.conversation_history, max(0, len(self.conversation_history) - 10), None
+            ))
         }
     
     def set_emergency_contacts(self, contacts: List[Dict]):
@@ -7,9 +7,11 @@ Handles initialization and provides easy startup options
 import os
 import sys
 import subprocess
+import threading
 import time
 import signal
 from datetime import datetime
+from importlib.util import find_spec
 
 def print_banner():
     """Print startup banner"""
@@ -29,11 +31,12 @@ def check_dependencies():
     
     missing_packages = []
     
+    # Locate each package without importing it (numpy/pandas/sklearn take
+    # seconds and hundreds of MB to initialize just to print a check-mark)
     for package in required_packages:
-        try:
-            __import__(package)
+        if find_spec(package) is not None:
             print(f"✓ {package}")
-        except ImportError:
+        else:
             missing_packages.append(package)
             print(f"✗ {package} (missing)")
     
@@ -69,29 +72,58 @@ def run_tests():
         print(f"✗ Test execution failed: {e}")
         return False
 
+def _stream_output(process, label):
+    """Echo a child process's output as it arrives (keeps its pipe drained)"""
+    def pump():
+        for line in process.stdout:
+            print(f"[{label}] {line}", end="")
+    
+    thread = threading.Thread(target=pump, daemon=True)
+    thread.start()
+    return thread
+
+def _wait_for_http(url, process, timeout=30.0):
+    """Poll url until the server answers, the process exits or timeout passes"""
+    import requests
+    
+    deadline = time.monotonic() + timeout
+    delay = 0.1
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            if requests.get(url, timeout=0.5).status_code < 500:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(delay)
+        delay = min(delay * 2, 1.0)
+    return False
+
 def start_ai_server():
     """Start the AI API server"""
     print("\n🚀 Starting AI API server...")
     
     try:
-        # Start the Flask server
+        # Start the Flask server, unbuffered so its log lines stream through
         process = subprocess.Popen([
             sys.executable, 'enhanced_api_server.py'
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        
-        # Wait a moment for server to start
-        time.sleep(3)
+        ], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+           env={**os.environ, 'PYTHONUNBUFFERED': '1'})
+        output = _stream_output(process, "ai")
         
-        # Check if server is running
-        if process.poll() is None:
+        # Wait until the health check answers instead of a fixed sleep
+        if _wait_for_http("http://localhost:5000/health", process):
             print("✓ AI API server started successfully!")
             print("📍 Server running at: http://localhost:5000")
             print("🔗 Health check: http://localhost:5000/health")
             return process
+        elif process.poll() is None:
+            print("⚠️  AI API server is still starting (health check not answering yet)")
+            return process
         else:
-            stdout, stderr = process.communicate()
-            print("✗ Failed to start AI server:")
-            print(stderr.decode())
+            output.join(timeout=1)
+            print("✗ Failed to start AI server (see output above)")
             return None
             
     except Exception as e:
@@ -115,31 +147,31 @@ def start_node_server():
                 try:
                     process = subprocess.Popen([
                         'npm', 'start'
-                    ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
+                    ], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, shell=True)
                 except:
                     process = subprocess.Popen([
                         'cmd', '/c', 'npm', 'start'
-                    ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                    ], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
             else:  # Unix/Linux/Mac
                 process = subprocess.Popen([
                     'npm', 'start'
-                ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                ], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
         except Exception as e:
             print(f"✗ Failed to start Node.js server: {e}")
             return None
+        output = _stream_output(process, "node")
         
-        # Wait a moment for server to start
-        time.sleep(5)
-        
-        # Check if server is running
-        if process.poll() is None:
+        # Wait until the server accepts requests instead of a fixed sleep
+        if _wait_for_http("http://localhost:8080/", process, timeout=15.0):
             print("✓ Node.js server started successfully!")
             print("📍 Server running at: http://localhost:8080")
             return process
+        elif process.poll() is None:
+            print("⚠️  Node.js server is still starting (not answering yet)")
+            return process
         else:
-            stdout, stderr = process.communicate()
-            print("✗ Failed to start Node.js server:")
-            print(stderr.decode())
+            output.join(timeout=1)
+            print("✗ Failed to start Node.js server (see output above)")
             return None
             
     except Exception as e:
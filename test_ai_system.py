@@ -5,11 +5,14 @@ Validates all components and integration
 
 import sys
 import os
-import json
+import time
+import warnings
 from datetime import datetime, timedelta
 
-# Add pythonScript to path
-sys.path.append(os.path.join(os.path.dirname(__file__), 'pythonScript'))
+# Add pythonScript to path (first, so project modules resolve without scanning the rest)
+PYTHON_SCRIPT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pythonScript')
+if PYTHON_SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, PYTHON_SCRIPT_DIR)
 
 def test_imports():
     """Test that all modules can be imported"""
@@ -75,6 +78,79 @@ def test_safety_model():
         print(f"✗ Safety model test failed: {e}")
         return False
 
+def test_prediction_paths():
+    """Test the fast prediction paths against the sklearn pipeline"""
+    print("\nTesting Prediction Paths...")
+    
+    import numpy as np
+    import pandas as pd
+    from forest_predictor import FlattenedForest
+    from predictive_safety_model import PredictiveSafetyModel
+    
+    model = PredictiveSafetyModel()
+    model.ensure_trained()
+    rng = np.random.default_rng(42)
+    
+    # Flattened forest vs RandomForestRegressor on random scaled rows
+    X = rng.normal(scale=2.0, size=(2000, len(model.feature_columns)))
+    forest_error = np.abs(FlattenedForest(model.model).predict(X) - model.model.predict(X)).max()
+    assert forest_error < 1e-9, forest_error
+    print(f"✓ Flattened forest matches sklearn (max error {forest_error:.1e})")
+    
+    # Random locations around Delhi at random times
+    n = 200
+    lats = 28.6139 + rng.uniform(-0.05, 0.05, n)
+    lngs = 77.2090 + rng.uniform(-0.05, 0.05, n)
+    timestamps = [datetime(2024, 1, 1) + timedelta(minutes=int(m)) for m in rng.integers(0, 60 * 24 * 366, n)]
+    
+    # Feature matrix rows vs per-location feature vectors
+    features = model.create_feature_matrix(lats, lngs, timestamps)
+    vectors = np.array([
+        [model.create_feature_vector(lat, lng, timestamp)[name] for name in model.feature_columns]
+        for lat, lng, timestamp in zip(lats, lngs, timestamps)
+    ])
+    assert np.array_equal(features, vectors.astype(np.float32))
+    print("✓ Feature matrix matches feature vectors")
+    
+    # Inlined scaler + flattened forest vs StandardScaler + sklearn predict
+    # on the float64 feature values the original DataFrame pipeline scaled
+    batch = model.predict_safety_score_batch(lats, lngs, timestamps)
+    expected = np.clip(model.model.predict(
+        model.scaler.transform(pd.DataFrame(vectors, columns=model.feature_columns))
+    ), 0, 100)
+    pipeline_error = np.abs(batch - expected).max()
+    assert pipeline_error < 1e-9, pipeline_error
+    print(f"✓ Batch prediction matches the sklearn pipeline (max error {pipeline_error:.1e})")
+    
+    # Single-location prediction vs the batch path
+    single = np.array([
+        model.predict_safety_score(lat, lng, timestamp)
+        for lat, lng, timestamp in zip(lats, lngs, timestamps)
+    ])
+    single_error = np.abs(single - batch).max()
+    assert single_error < 1e-9, single_error
+    print(f"✓ Single predictions match the batch (max error {single_error:.1e})")
+    
+    # Route scoring with a timezone-aware departure uses its local wall time.
+    # Saturday 02:00+05:30 is Friday in UTC, and the model splits on weekday.
+    from datetime import timezone
+    from enhanced_route_optimizer import EnhancedRouteOptimizer
+    
+    optimizer = EnhancedRouteOptimizer(safety_model=model)
+    mock_route = optimizer._get_mock_routes(28.6139, 77.2090, 28.6169, 77.2120)[0]
+    aware_departure = datetime(2024, 1, 6, 2, 0, tzinfo=timezone(timedelta(hours=5, minutes=30)))
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')  # numpy warns when converting aware datetimes
+        aware_route = optimizer._calculate_route_safety_scores(mock_route, aware_departure)
+    naive_route = optimizer._calculate_route_safety_scores(mock_route, aware_departure.replace(tzinfo=None))
+    assert np.array_equal(aware_route.safety_scores, naive_route.safety_scores)
+    
+    first_step = model.predict_safety_score(aware_route.lats[0], aware_route.lngs[0], aware_departure)
+    assert abs(aware_route.safety_scores[0] - first_step) < 1e-9, (aware_route.safety_scores[0], first_step)
+    print("✓ Aware departure scored at its local wall time on both paths")
+    
+    return True
+
 def test_geofencing():
     """Test dynamic geofencing"""
     print("\nTesting Dynamic Geofencing...")
@@ -108,6 +184,109 @@ def test_geofencing():
         print(f"✗ Geofencing test failed: {e}")
         return False
 
+def test_grid_score_hours():
+    """Test that off-route scores use the fix's local hour in a :30 timezone"""
+    print("\nTesting Grid Score Hours...")
+    
+    if not hasattr(time, 'tzset'):
+        print("✓ Skipped: time.tzset is not available on this platform")
+        return True
+    
+    from dynamic_geofencing import DynamicGeofencing
+    
+    class RecordingModel:
+        """Stands in for the safety model and records prediction times"""
+        def __init__(self):
+            self.timestamps = []
+        
+        def predict_safety_score(self, lat, lng, timestamp=None):
+            self.timestamps.append(timestamp)
+            return 42.0
+    
+    previous_tz = os.environ.get('TZ')
+    os.environ['TZ'] = 'Asia/Kolkata'  # UTC+5:30
+    time.tzset()
+    try:
+        model = RecordingModel()
+        geofencing = DynamicGeofencing(safety_model=model)
+        
+        # 10:10 and 10:50 share the 10:00 bucket; 11:05 starts a new one
+        for minute_of_day in (10 * 60 + 10, 10 * 60 + 50, 11 * 60 + 5):
+            fix_time = datetime(2024, 1, 1) + timedelta(minutes=minute_of_day)
+            geofencing._lookup_zone_score(28.6139, 77.2090, fix_time)
+    finally:
+        if previous_tz is None:
+            del os.environ['TZ']
+        else:
+            os.environ['TZ'] = previous_tz
+        time.tzset()
+    
+    assert model.timestamps == [datetime(2024, 1, 1, 10), datetime(2024, 1, 1, 11)], model.timestamps
+    print(f"✓ Model called for hours {[t.hour for t in model.timestamps]}")
+    
+    return True
+
+def test_route_deviation():
+    """Test the equirectangular deviation prefilter against exact haversine"""
+    print("\nTesting Route Deviation...")
+    
+    import numpy as np
+    from dynamic_geofencing import DynamicGeofencing, LocationData
+    from geofence_kernels import haversine_distance
+    
+    geofencing = DynamicGeofencing()
+    route = [(28.6139 + 0.001 * i, 77.2090 + 0.0012 * i) for i in range(20)]
+    geofencing.set_planned_route(route)
+    
+    # Fixes scattered around the route, many of them near the 200m threshold
+    rng = np.random.default_rng(7)
+    anchors = rng.integers(0, len(route), 5000)
+    offsets = rng.uniform(150, 250, 5000) / 111320  # metres to degrees, roughly
+    angles = rng.uniform(0, 2 * np.pi, 5000)
+    
+    mismatches = 0
+    for anchor, offset, angle in zip(anchors, offsets, angles):
+        lat = route[anchor][0] + offset * np.sin(angle)
+        lng = route[anchor][1] + offset * np.cos(angle) / np.cos(np.radians(lat))
+        expected = min(haversine_distance(lat, lng, *point) for point in route) > 200
+        location = LocationData(lat=lat, lng=lng, timestamp=datetime.now())
+        mismatches += geofencing._has_deviated_from_route(location) != expected
+    
+    assert mismatches == 0, mismatches
+    print("✓ Deviation check matches exact haversine on 5000 fixes")
+    
+    return True
+
+def test_stopped_duration():
+    """Test that stopped time counts from the start of the stopped run"""
+    print("\nTesting Stopped Duration...")
+    
+    from dynamic_geofencing import AlertPhase, DynamicGeofencing
+    
+    geofencing = DynamicGeofencing()
+    geofencing.set_planned_route([(28.6139, 77.2090), (28.6149, 77.2100)])
+    # Without a model every route zone scores 50; treat that as unsafe here
+    geofencing.safety_score_threshold = 60
+    
+    # Moving, then stopped at one spot for 6 minutes
+    start = datetime(2024, 1, 1, 22, 0)
+    geofencing.update_user_location(28.6139, 77.2090, 20.0, timestamp=start - timedelta(minutes=1))
+    anomalies = [
+        geofencing.update_user_location(28.6139, 77.2090, 0.0, timestamp=start + timedelta(minutes=minutes))
+        for minutes in (0, 2, 4, 6)
+    ]
+    
+    stopped_duration = geofencing._get_stopped_duration(start + timedelta(minutes=6))
+    assert abs(stopped_duration - 6) < 1e-6, stopped_duration
+    print(f"✓ Stopped duration: {stopped_duration:.1f} minutes")
+    
+    # Only the fix past the 5-minute threshold is an anomaly
+    assert anomalies == [False, False, False, True], anomalies
+    assert geofencing.current_phase is AlertPhase.SOFT_CHECK, geofencing.current_phase
+    print(f"✓ Anomalies {anomalies} moved the phase to {geofencing.current_phase.value}")
+    
+    return True
+
 def test_route_optimizer():
     """Test enhanced route optimizer"""
     print("\nTesting Enhanced Route Optimizer...")
@@ -213,50 +392,89 @@ def test_integrated_system():
         ai_system.end_user_session(user_id)
         print("✓ Session ended successfully")
         
+        # Calls for an ended session are refused before touching shared state
+        history_count = ai_system.geofencing._hist_count
+        assert ai_system.update_user_location(user_id, 28.6149, 77.2100) == {"error": "User session not found"}
+        assert ai_system.geofencing._hist_count == history_count
+        assert ai_system.process_sakha_message(user_id, "hello") == {"error": "User session not found"}
+        print("✓ Ended session rejected without updating geofence")
+        
         return True
         
     except Exception as e:
         print(f"✗ Integrated system test failed: {e}")
         return False
 
+def _check_api_endpoints(call_api):
+    """Run the API probes; call_api(method, path, json=None) returns (status, body)"""
+    # Test health check
+    status, _ = call_api('GET', '/health')
+    if status == 200:
+        print("✓ Health check passed")
+    else:
+        print(f"✗ Health check failed: {status}")
+        return False
+    
+    # Test route planning
+    route_data = {
+        "source": {"lat": 28.6139, "lng": 77.2090},
+        "destination": {"lat": 28.6169, "lng": 77.2120},
+        "user_id": "test_api_user"
+    }
+    
+    status, data = call_api('POST', '/api/plan-safe-route', route_data)
+    if status == 200:
+        if data.get('success'):
+            print("✓ API route planning successful")
+        else:
+            print(f"✗ API route planning failed: {data.get('error', 'Unknown error')}")
+            return False
+    else:
+        print(f"✗ API route planning failed: {status}")
+        return False
+    
+    return True
+
 def test_api_endpoints():
-    """Test API endpoints (requires Flask server running)"""
+    """Test API endpoints in-process through the Flask test client
+    (ENABLE_NETWORK_TESTS=1 tests a running server over HTTP instead)"""
     print("\nTesting API Endpoints...")
     
+    if os.environ.get('ENABLE_NETWORK_TESTS') == '1':
+        return _test_api_server()
+    
     try:
-        import requests
+        from enhanced_api_server import app
         
-        base_url = "http://localhost:5000"
+        client = app.test_client()
         
-        # Test health check
-        response = requests.get(f"{base_url}/health", timeout=5)
-        if response.status_code == 200:
-            print("✓ Health check passed")
-        else:
-            print(f"✗ Health check failed: {response.status_code}")
-            return False
+        def call_api(method, path, json=None):
+            response = client.open(path, method=method, json=json)
+            return response.status_code, response.get_json()
         
-        # Test route planning
-        route_data = {
-            "source": {"lat": 28.6139, "lng": 77.2090},
-            "destination": {"lat": 28.6169, "lng": 77.2120},
-            "user_id": "test_api_user"
-        }
-        
-        response = requests.post(f"{base_url}/api/plan-safe-route", 
-                               json=route_data, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            if data.get('success'):
-                print("✓ API route planning successful")
-            else:
-                print(f"✗ API route planning failed: {data.get('error', 'Unknown error')}")
-                return False
-        else:
-            print(f"✗ API route planning failed: {response.status_code}")
-            return False
+        return _check_api_endpoints(call_api)
         
-        return True
+    except Exception as e:
+        print(f"✗ API test failed: {e}")
+        return False
+
+def _test_api_server():
+    """Run the API probes over HTTP (requires Flask server running)"""
+    try:
+        import requests
+        
+        base_url = "http://localhost:5000"
+        
+        # Reuse one keep-alive connection for both probes
+        with requests.Session() as session:
+            session.trust_env = False  # localhost only: skip proxy/netrc lookups
+            
+            def call_api(method, path, json=None):
+                response = session.request(method, f"{base_url}{path}", json=json,
+                                           timeout=5 if method == 'GET' else 10)
+                return response.status_code, response.json()
+            
+            return _check_api_endpoints(call_api)
         
     except requests.exceptions.ConnectionError:
         print("✗ API server not running. Start with: python enhanced_api_server.py")
@@ -265,6 +483,85 @@ def test_api_endpoints():
         print(f"✗ API test failed: {e}")
         return False
 
+def test_api_predict_safety_score():
+    """Test that /api/predict-safety-score uses the client's wall-clock time"""
+    print("\nTesting API Safety Score Timestamps...")
+    
+    from enhanced_api_server import app, get_system
+    
+    client = app.test_client()
+    # Saturday 02:00 local; the shipped model splits on day of week, which a
+    # shift to UTC or the server's zone would move back to Friday
+    expected = get_system().safety_model.predict_safety_score(28.6139, 77.2090, datetime(2024, 1, 6, 2, 0))
+    
+    # The same 02:00 wall time, with and without an offset, in two server timezones
+    scores = []
+    for server_tz in ('UTC', 'America/New_York'):
+        previous_tz = os.environ.get('TZ')
+        if hasattr(time, 'tzset'):
+            os.environ['TZ'] = server_tz
+            time.tzset()
+        try:
+            for timestamp in ("2024-01-06T02:00:00+05:30", "2024-01-06T02:02:00", "2024-01-06T02:04:59Z"):
+                response = client.post('/api/predict-safety-score', json={
+                    "lat": 28.6139, "lng": 77.2090, "timestamp": timestamp
+                })
+                assert response.status_code == 200, response.get_json()
+                scores.append(response.get_json()["data"]["safety_score"])
+        finally:
+            if hasattr(time, 'tzset'):
+                if previous_tz is None:
+                    del os.environ['TZ']
+                else:
+                    os.environ['TZ'] = previous_tz
+                time.tzset()
+    
+    assert all(abs(score - expected) < 1e-9 for score in scores), (scores, expected)
+    print(f"✓ All timestamps scored at Saturday 02:00 local: {expected:.2f}")
+    
+    return True
+
+def test_api_batch():
+    """Test the /api/batch endpoint through the Flask test client"""
+    print("\nTesting API Batch...")
+    
+    from enhanced_api_server import MAX_BATCH_CALLS, app
+    
+    client = app.test_client()
+    user_id = "test_batch_user"
+    
+    # Calls run in order, so the later ones see the planned route's session
+    response = client.post('/api/batch', json=[
+        {
+            "op": "plan_route",
+            "source": {"lat": 28.6139, "lng": 77.2090},
+            "destination": {"lat": 28.6169, "lng": 77.2120},
+            "user_id": user_id
+        },
+        {"op": "update_location", "user_id": user_id, "location": {"lat": 28.6149, "lng": 77.2100}},
+        {"op": "safety_status", "user_id": user_id},
+        {"op": "no_such_op"},
+        "not a call"
+    ])
+    assert response.status_code == 200, response.status_code
+    results = response.get_json()
+    
+    assert [result["status"] for result in results] == [200, 200, 200, 400, 400], results
+    assert all(result["body"]["success"] for result in results[:3]), results[:3]
+    assert results[2]["body"]["data"]["user_id"] == user_id, results[2]
+    print("✓ Ordered plan -> update -> status batch succeeded")
+    
+    assert results[3]["body"]["error"] == "Unknown batch op: no_such_op", results[3]
+    assert results[4]["body"]["error"] == "Batch call must be an object", results[4]
+    print("✓ Unknown op and non-dict entry rejected per call")
+    
+    # Oversized batches are refused outright
+    response = client.post('/api/batch', json=[{"op": "safety_status", "user_id": user_id}] * (MAX_BATCH_CALLS + 1))
+    assert response.status_code == 400, response.status_code
+    print(f"✓ Batch of {MAX_BATCH_CALLS + 1} calls rejected")
+    
+    return True
+
 def main():
     """Run all tests"""
     print("=" * 60)
@@ -274,11 +571,17 @@ def main():
     tests = [
         ("Import Test", test_imports),
         ("Safety Model Test", test_safety_model),
+        ("Prediction Paths Test", test_prediction_paths),
         ("Geofencing Test", test_geofencing),
+        ("Grid Score Hours Test", test_grid_score_hours),
+        ("Route Deviation Test", test_route_deviation),
+        ("Stopped Duration Test", test_stopped_duration),
         ("Route Optimizer Test", test_route_optimizer),
         ("Sakha Chatbot Test", test_sakha_chatbot),
         ("Integrated System Test", test_integrated_system),
-        ("API Endpoints Test", test_api_endpoints)
+        ("API Endpoints Test", test_api_endpoints),
+        ("API Safety Score Timestamps Test", test_api_predict_safety_score),
+        ("API Batch Test", test_api_batch)
     ]
     
     passed = 0
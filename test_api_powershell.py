@@ -4,24 +4,95 @@ PowerShell-compatible API test script
 """
 
 import requests
-import json
+import orjson
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-def test_route_planning():
+# main() sends its four calls as a single /api/batch request; the test_*
+# functions called on their own make one request each. Either way requests
+# go out one at a time to localhost: one pooled keep-alive connection, no
+# retries, and no proxy/netrc lookups from the environment.
+SESSION = requests.Session()
+SESSION.headers["Connection"] = "keep-alive"
+SESSION.trust_env = False
+SESSION.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=Retry(total=0)))
+
+BASE_URL = "http://localhost:5000"
+USER_ID = "test_user_powershell"
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Single-endpoint fallback for servers without /api/batch: op -> (method, path)
+ENDPOINTS = {
+    "plan_route": ("POST", "/api/plan-safe-route"),
+    "update_location": ("POST", "/api/update-location"),
+    "sakha_chat": ("POST", "/api/sakha-chat"),
+    "safety_status": ("GET", "/api/safety-status/{user_id}"),
+}
+
+def route_call(user_id):
+    """Route planning call for a user"""
+    return {
+        "op": "plan_route",
+        "source": {"lat": 28.6139, "lng": 77.2090},
+        "destination": {"lat": 28.6169, "lng": 77.2120},
+        "user_id": user_id
+    }
+
+def location_call(user_id):
+    """Location update call for a user"""
+    return {
+        "op": "update_location",
+        "user_id": user_id,
+        "location": {"lat": 28.6149, "lng": 77.2100},
+        "speed": 0.0
+    }
+
+def chat_call(user_id):
+    """Sakha chat call for a user"""
+    return {
+        "op": "sakha_chat",
+        "user_id": user_id,
+        "message": "I'm feeling unsafe and need help"
+    }
+
+def status_call(user_id):
+    """Safety status call for a user"""
+    return {"op": "safety_status", "user_id": user_id}
+
+# The main() batch, serialized once
+BATCH_CALLS = [route_call(USER_ID), location_call(USER_ID), chat_call(USER_ID), status_call(USER_ID)]
+BATCH_BODY = orjson.dumps(BATCH_CALLS)
+
+def run_call(call):
+    """Send one call to its own endpoint; returns (status, body)"""
+    method, path = ENDPOINTS[call["op"]]
+    payload = {key: value for key, value in call.items() if key != "op"}
+    url = BASE_URL + path.format(**payload)
+    
+    if method == "POST":
+        response = SESSION.post(url, data=orjson.dumps(payload), headers=JSON_HEADERS)
+    else:
+        response = SESSION.get(url)
+    return response.status_code, orjson.loads(response.content)
+
+def run_batch(calls, body):
+    """Send calls, pre-serialized as body, in one /api/batch request;
+    returns (status, body) per call"""
+    response = SESSION.post(f"{BASE_URL}/api/batch", data=body, headers=JSON_HEADERS)
+    if response.status_code == 404:
+        return [run_call(call) for call in calls]
+    
+    response.raise_for_status()
+    return [(result["status"], result["body"]) for result in orjson.loads(response.content)]
+
+def test_route_planning(response=None):
     """Test route planning endpoint"""
     print("🧪 Testing AI Route Planning...")
     
     try:
-        url = "http://localhost:5000/api/plan-safe-route"
-        data = {
-            "source": {"lat": 28.6139, "lng": 77.2090},
-            "destination": {"lat": 28.6169, "lng": 77.2120},
-            "user_id": "test_user_powershell"
-        }
+        status, result = response or run_call(route_call(USER_ID))
         
-        response = requests.post(url, json=data)
-        
-        if response.status_code == 200:
-            result = response.json()
+        if status == 200:
             if result.get('success'):
                 route_info = result['data']
                 print("✅ Route planning successful!")
@@ -34,62 +105,48 @@ def test_route_planning():
                 print(f"❌ Route planning failed: {result.get('error')}")
                 return None
         else:
-            print(f"❌ HTTP Error: {response.status_code}")
-            print(f"Response: {response.text}")
+            print(f"❌ HTTP Error: {status}")
+            print(f"Response: {result}")
             return None
             
     except Exception as e:
         print(f"❌ Error: {e}")
         return None
 
-def test_location_update(user_id):
+def test_location_update(user_id, response=None):
     """Test location update endpoint"""
     print("\n🧪 Testing Location Update...")
     
     try:
-        url = "http://localhost:5000/api/update-location"
-        data = {
-            "user_id": user_id,
-            "location": {"lat": 28.6149, "lng": 77.2100},
-            "speed": 0.0
-        }
-        
-        response = requests.post(url, json=data)
+        status, result = response or run_call(location_call(user_id))
         
-        if response.status_code == 200:
-            result = response.json()
+        if status == 200:
             if result.get('success'):
                 print("✅ Location update successful!")
-                print(f"   Anomaly detected: {result['data'].get('anomaly_detected', False)}")
-                if result['data'].get('sakha_intervention'):
-                    print(f"   Sakha intervention: {result['data']['sakha_intervention'].get('intervention_type', 'unknown')}")
+                location_info = result['data']
+                print(f"   Anomaly detected: {location_info.get('anomaly_detected', False)}")
+                if location_info.get('sakha_intervention'):
+                    print(f"   Sakha intervention: {location_info['sakha_intervention'].get('intervention_type', 'unknown')}")
                 return True
             else:
                 print(f"❌ Location update failed: {result.get('error')}")
                 return False
         else:
-            print(f"❌ HTTP Error: {response.status_code}")
+            print(f"❌ HTTP Error: {status}")
             return False
             
     except Exception as e:
         print(f"❌ Error: {e}")
         return False
 
-def test_sakha_chat(user_id):
+def test_sakha_chat(user_id, response=None):
     """Test Sakha chatbot endpoint"""
     print("\n🧪 Testing Sakha Chatbot...")
     
     try:
-        url = "http://localhost:5000/api/sakha-chat"
-        data = {
-            "user_id": user_id,
-            "message": "I'm feeling unsafe and need help"
-        }
-        
-        response = requests.post(url, json=data)
+        status, result = response or run_call(chat_call(user_id))
         
-        if response.status_code == 200:
-            result = response.json()
+        if status == 200:
             if result.get('success'):
                 print("✅ Sakha chat successful!")
                 print(f"   Response: {result['data'].get('message', 'No response')[:100]}...")
@@ -98,24 +155,21 @@ def test_sakha_chat(user_id):
                 print(f"❌ Sakha chat failed: {result.get('error')}")
                 return False
         else:
-            print(f"❌ HTTP Error: {response.status_code}")
+            print(f"❌ HTTP Error: {status}")
             return False
             
     except Exception as e:
         print(f"❌ Error: {e}")
         return False
 
-def test_safety_status(user_id):
+def test_safety_status(user_id, response=None):
     """Test safety status endpoint"""
     print("\n🧪 Testing Safety Status...")
     
     try:
-        url = f"http://localhost:5000/api/safety-status/{user_id}"
+        status, result = response or run_call(status_call(user_id))
         
-        response = requests.get(url)
-        
-        if response.status_code == 200:
-            result = response.json()
+        if status == 200:
             if result.get('success'):
                 print("✅ Safety status retrieved!")
                 safety_status = result['data'].get('safety_status', {})
@@ -126,7 +180,7 @@ def test_safety_status(user_id):
                 print(f"❌ Safety status failed: {result.get('error')}")
                 return False
         else:
-            print(f"❌ HTTP Error: {response.status_code}")
+            print(f"❌ HTTP Error: {status}")
             return False
             
     except Exception as e:
@@ -139,24 +193,31 @@ def main():
     print("🚀 Safe Route AI System - PowerShell Test Suite")
     print("=" * 60)
     
+    user_id = USER_ID
+    
+    # All four calls go to the server as one batch, in order
+    try:
+        route, location, chat, safety = run_batch(BATCH_CALLS, BATCH_BODY)
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        return False
+    
     # Test route planning
-    route_id = test_route_planning()
+    route_id = test_route_planning(route)
     if not route_id:
         print("\n❌ Route planning failed. Cannot continue with other tests.")
         return False
     
-    user_id = "test_user_powershell"
-    
     # Test location update
-    if not test_location_update(user_id):
+    if not test_location_update(user_id, location):
         print("\n⚠️  Location update failed, but continuing...")
     
     # Test Sakha chat
-    if not test_sakha_chat(user_id):
+    if not test_sakha_chat(user_id, chat):
         print("\n⚠️  Sakha chat failed, but continuing...")
     
     # Test safety status
-    if not test_safety_status(user_id):
+    if not test_safety_status(user_id, safety):
         print("\n⚠️  Safety status failed, but continuing...")
     
     print("\n" + "=" * 60)
@@ -166,4 +227,7 @@ def main():
     return True
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        SESSION.close()